@@ -0,0 +1,256 @@
+import fnmatch, json, os, shlex, subprocess, time
+from concurrent.futures import ThreadPoolExecutor
+from basis_plugin_helper.fileutils import file_digest, string_digest, load_json, save_json
+
+# bump to invalidate all cached results
+CACHE_VERSION = "1"
+
+# Results are keyed by contents, so all packages and variants share one cache dir
+# that survives cache builds (conan removes build folder before build).
+def default_analysis_cache_dir():
+    home = os.getenv("CONAN_USER_HOME", os.path.expanduser("~"))
+    return os.path.join(home, ".conan", "analysis_cache")
+
+# compiler arguments that must not be passed to preprocessor and analyzers
+# (name -> has separate value)
+OUTPUT_ARGS = {
+    "-o": True,
+    "-c": False,
+    "-MD": False,
+    "-MMD": False,
+    "-MF": True,
+    "-MT": True,
+    "-MQ": True,
+}
+
+# arguments of compile command passed to cppcheck and cppclean
+INCLUDE_ARGS = ("-I", "-isystem", "-iquote")
+DEFINE_ARGS = ("-D", "-U")
+
+class CompileCommand:
+    def __init__(self, file, directory, arguments):
+        self.file = file
+        self.directory = directory
+        self.arguments = arguments
+
+    # compiler arguments without compiler, source file and outputs
+    @property
+    def flags(self):
+        flags = []
+        args = list(self.arguments[1:])
+        while args:
+            arg = args.pop(0)
+            if arg in OUTPUT_ARGS:
+                if OUTPUT_ARGS[arg] and args:
+                    args.pop(0)
+            elif arg.startswith(("-MF", "-MT", "-MQ")):
+                # -MFfile
+                continue
+            elif os.path.abspath(os.path.join(self.directory, arg)) == self.file:
+                continue
+            else:
+                flags.append(arg)
+        return flags
+
+    # Returns list of (prefix, value), both "-I dir" and "-Idir" forms
+    def _values(self, prefixes):
+        values = []
+        args = self.flags
+        for index, arg in enumerate(args):
+            for prefix in prefixes:
+                if arg == prefix and index + 1 < len(args):
+                    values.append((prefix, args[index + 1]))
+                elif arg.startswith(prefix) and arg != prefix:
+                    values.append((prefix, arg[len(prefix):]))
+        return values
+
+    @property
+    def include_flags(self):
+        return ["-I" + value for _, value in self._values(INCLUDE_ARGS)]
+
+    @property
+    def define_flags(self):
+        return [prefix + value for prefix, value in self._values(DEFINE_ARGS)]
+
+    @property
+    def std(self):
+        for arg in self.flags:
+            if arg.startswith("-std="):
+                # gnu++17 -> c++17
+                return arg[len("-std="):].replace("gnu", "c")
+        return None
+
+# Reads compile_commands.json generated by CMAKE_EXPORT_COMPILE_COMMANDS
+# see https://clang.llvm.org/docs/JSONCompilationDatabase.html
+def load_compile_commands(path):
+    commands = []
+    for entry in load_json(path, []):
+        directory = entry["directory"]
+        arguments = entry.get("arguments") or shlex.split(entry["command"])
+        commands.append(CompileCommand(
+            file=os.path.abspath(os.path.join(directory, entry["file"])),
+            directory=directory,
+            arguments=arguments))
+    return commands
+
+# Analyzer runs on one translation unit,
+# `command` returns analyzer command, `has_findings` checks its output
+class Analyzer:
+    def __init__(self, name, program, args = ()):
+        self.name = name
+        self.program = program
+        self.args = list(args)
+
+    def command(self, compile_command, build_folder):
+        raise NotImplementedError
+
+    def has_findings(self, returncode, output):
+        return returncode != 0 or "warning:" in output or "error:" in output
+
+class ClangTidy(Analyzer):
+    def command(self, compile_command, build_folder):
+        return [self.program, "-p", build_folder, "--quiet"] + self.args + [compile_command.file]
+
+class Cppcheck(Analyzer):
+    def command(self, compile_command, build_folder):
+        std = compile_command.std
+        return [self.program, "--quiet", "--language=c++", "--template=gcc",
+                "--enable=warning,performance,portability", "--inline-suppr"] \
+            + (["--std=" + std] if std else []) \
+            + compile_command.include_flags + compile_command.define_flags \
+            + self.args + [compile_command.file]
+
+class IncludeWhatYouUse(Analyzer):
+    def command(self, compile_command, build_folder):
+        return [self.program] + self.args + compile_command.flags + [compile_command.file]
+
+    # iwyu returns non-zero exit code even if includes are correct
+    def has_findings(self, returncode, output):
+        return "should add these lines" in output or "should remove these lines" in output
+
+class Cppclean(Analyzer):
+    def command(self, compile_command, build_folder):
+        return [self.program] \
+            + ["--include-path=" + flag[len("-I"):] for flag in compile_command.include_flags] \
+            + self.args + [compile_command.file]
+
+    def has_findings(self, returncode, output):
+        return output.strip() != ""
+
+ANALYZERS = {
+    "clang-tidy": ClangTidy,
+    "cppcheck": Cppcheck,
+    "iwyu": IncludeWhatYouUse,
+    "cppclean": Cppclean,
+}
+
+# Runs analyzers on translation units from compile_commands.json in parallel.
+# Result of analyzer is cached per translation unit, cache key is
+# digest of preprocessed translation unit (source file and all included headers),
+# analyzer executable, its arguments and config files,
+# so only changed translation units are analyzed again.
+class AnalysisRunner:
+    def __init__(self, output, build_folder, cache_dir, jobs,
+                 config_files = (), use_cache = True):
+        self.output = output
+        self.build_folder = build_folder
+        self.cache_dir = cache_dir
+        self.jobs = max(1, jobs)
+        self.use_cache = use_cache
+        self.config_digest = string_digest(json.dumps(
+            dict((path, file_digest(path)) for path in config_files), sort_keys=True))
+        # analyzer executables are large, digest is computed once per run
+        self.program_digests = {}
+
+    def _result_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    # Digest of preprocessed translation unit or None if preprocessing failed
+    def _preprocessed_digest(self, compile_command):
+        process = subprocess.run(
+            [compile_command.arguments[0], "-E"] + compile_command.flags + [compile_command.file],
+            cwd=compile_command.directory, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if process.returncode != 0:
+            return None
+        return string_digest(process.stdout.decode("utf-8", "replace"))
+
+    def _analyzer_key(self, analyzer, compile_command):
+        return string_digest(json.dumps({
+            "version": CACHE_VERSION,
+            "analyzer": analyzer.name,
+            "program": self.program_digests[analyzer.program],
+            "command": analyzer.command(compile_command, self.build_folder)[1:],
+            # clang-tidy reads flags from compile_commands.json
+            "flags": compile_command.flags,
+            "config": self.config_digest,
+        }, sort_keys=True))
+
+    def _analyze(self, analyzer, compile_command, analyzer_key, preprocessed_digest):
+        key = string_digest(analyzer_key + "\n" + (preprocessed_digest or ""))
+        result_path = self._result_path(key)
+        if self.use_cache and preprocessed_digest:
+            cached = load_json(result_path)
+            if cached is not None:
+                cached["status"] = "cached"
+                return cached
+
+        start = time.time()
+        process = subprocess.run(analyzer.command(compile_command, self.build_folder),
+                                 cwd=compile_command.directory,
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = process.stdout.decode("utf-8", "replace")
+        result = {
+            "file": compile_command.file,
+            "analyzer": analyzer.name,
+            "findings": analyzer.has_findings(process.returncode, output),
+            "output": output,
+            "duration": round(time.time() - start, 3),
+        }
+        # translation unit that can not be preprocessed is analyzed every time
+        if preprocessed_digest:
+            save_json(result_path, result)
+        result["status"] = "analyzed"
+        return result
+
+    def _analyze_unit(self, analyzers, compile_command):
+        preprocessed_digest = self._preprocessed_digest(compile_command)
+        results = []
+        for analyzer in analyzers:
+            result = self._analyze(analyzer, compile_command,
+                self._analyzer_key(analyzer, compile_command), preprocessed_digest)
+            if result["status"] == "analyzed":
+                self.output.info("{} {} ({:.2f} sec){}".format(
+                    analyzer.name, os.path.relpath(compile_command.file, self.build_folder),
+                    result["duration"], ", findings" if result["findings"] else ""))
+            results.append(result)
+        return results
+
+    def run(self, analyzers, compile_commands):
+        for analyzer in analyzers:
+            program = analyzer.program
+            self.program_digests[program] = file_digest(program) if os.path.isfile(program) else program
+        results = []
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            for unit_results in executor.map(
+                    lambda compile_command: self._analyze_unit(analyzers, compile_command),
+                    compile_commands):
+                results.extend(unit_results)
+        return results
+
+# Returns compile commands of source files matching none of `exclude` patterns
+def filter_compile_commands(compile_commands, exclude):
+    files = set()
+    selected = []
+    for compile_command in compile_commands:
+        if compile_command.file in files:
+            continue
+        if any(fnmatch.fnmatch(compile_command.file, pattern) for pattern in exclude):
+            continue
+        files.add(compile_command.file)
+        selected.append(compile_command)
+    return selected
+
+def write_analysis_report(results, path):
+    save_json(path, {
+        "results": sorted(results, key=lambda result: (result["file"], result["analyzer"])),
+    })
@@ -0,0 +1,166 @@
+import os, platform, statistics, subprocess, time
+from conans.errors import ConanException
+from basis_plugin_helper.fileutils import load_json
+
+# CTest labels of benchmarks, see `add_plugin_benchmark`
+BENCHMARK_LABEL = "benchmark"
+GOOGLE_BENCHMARK_LABEL = "google_benchmark"
+
+# timeout of `--benchmark_list_tests` probe
+PROBE_TIMEOUT_SEC = 60
+
+TIME_UNIT_NS = {"ns": 1, "us": 1000, "ms": 1000000, "s": 1000000000}
+
+def is_benchmark(test):
+    return BENCHMARK_LABEL in test.labels
+
+def _cpu_model():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.partition(":")[2].strip()
+    except (IOError, OSError):
+        pass
+    return platform.processor()
+
+# Machine that ran benchmarks, results of other machines are not comparable
+def host_fingerprint(cpus = None):
+    return {
+        "machine": platform.machine(),
+        "cpu_model": _cpu_model(),
+        "cpu_count": os.cpu_count(),
+        "cpus": cpus,
+    }
+
+# Returns list of fingerprint keys that differ between results and baseline,
+# baseline without fingerprint (older results) differs in all keys
+def host_differences(results, baseline):
+    current = results.get("context", {}).get("fingerprint", {})
+    recorded = baseline.get("context", {}).get("fingerprint", {})
+    return [key for key in sorted(current) if current.get(key) != recorded.get(key)]
+
+# Returns {name: time in ns} from Google Benchmark JSON output,
+# median of repetitions if benchmark was repeated
+# see https://github.com/google/benchmark/blob/main/docs/user_guide.md#output-formats
+def parse_google_benchmark(path):
+    report = load_json(path)
+    if not report or "benchmarks" not in report:
+        return None
+    iterations = {}
+    medians = {}
+    for entry in report["benchmarks"]:
+        value = entry["real_time"] * TIME_UNIT_NS.get(entry.get("time_unit", "ns"), 1)
+        name = entry.get("run_name", entry["name"])
+        if entry.get("run_type") == "aggregate":
+            if entry.get("aggregate_name") == "median":
+                medians[name] = value
+        else:
+            iterations.setdefault(name, []).append(value)
+    results = dict((name, statistics.median(values)) for name, values in iterations.items())
+    results.update(medians)
+    return results
+
+# Runs benchmarks one by one (optionally pinned to `cpus` using taskset).
+# Google Benchmark executables are repeated by themselves,
+# other executables are run `repetitions` times and median wall time is used.
+class BenchmarkRunner:
+    def __init__(self, output, results_dir, repetitions = 5, cpus = None, default_timeout = None):
+        self.output = output
+        self.results_dir = results_dir
+        self.repetitions = max(1, repetitions)
+        self.cpus = cpus
+        self.default_timeout = default_timeout
+
+    def _command(self, command):
+        if self.cpus:
+            return ["taskset", "--cpu-list", self.cpus] + command
+        return command
+
+    def _run_command(self, test, command):
+        env = os.environ.copy()
+        env.update(test.environment)
+        timeout = test.timeout or self.default_timeout
+        start = time.time()
+        process = subprocess.run(self._command(command), cwd=test.working_dir, env=env,
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                 timeout=float(timeout) if timeout else None)
+        if process.returncode != 0:
+            raise ConanException("benchmark {} failed:\n{}".format(
+                test.name, process.stdout.decode("utf-8", "replace")))
+        return (time.time() - start) * TIME_UNIT_NS["s"]
+
+    # Google Benchmark flags are passed only to Google Benchmark executables,
+    # others (Catch2, etc.) fail on unknown flags.
+    # NOTE: executable without label that ignores arguments runs once more for probe
+    def _is_google_benchmark(self, test):
+        if GOOGLE_BENCHMARK_LABEL in test.labels:
+            return True
+        env = os.environ.copy()
+        env.update(test.environment)
+        try:
+            process = subprocess.run(test.command + ["--benchmark_list_tests=true"],
+                                     cwd=test.working_dir, env=env,
+                                     stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                     timeout=PROBE_TIMEOUT_SEC)
+        except subprocess.TimeoutExpired:
+            return False
+        return process.returncode == 0
+
+    # Returns {metric name: time in ns}
+    def _run_benchmark(self, test):
+        if self._is_google_benchmark(test):
+            out_path = os.path.join(self.results_dir, "{}.json".format(test.name))
+            if os.path.exists(out_path):
+                os.remove(out_path)
+            self._run_command(test, test.command + [
+                "--benchmark_repetitions={}".format(self.repetitions),
+                "--benchmark_report_aggregates_only={}".format(
+                    "true" if self.repetitions > 1 else "false"),
+                "--benchmark_out={}".format(out_path),
+                "--benchmark_out_format=json",
+            ])
+            results = parse_google_benchmark(out_path) if os.path.exists(out_path) else None
+            if not results:
+                raise ConanException("benchmark {} did not write Google Benchmark results to {}".format(
+                    test.name, out_path))
+            return dict(("{}/{}".format(test.name, name), value)
+                        for name, value in results.items())
+        # not Google Benchmark, measure wall time of whole executable
+        wall_times = [self._run_command(test, test.command)
+                      for _ in range(self.repetitions)]
+        return {test.name: statistics.median(wall_times)}
+
+    def run(self, tests):
+        if not os.path.isdir(self.results_dir):
+            os.makedirs(self.results_dir)
+        results = {}
+        for test in sorted(tests, key=lambda test: test.name):
+            metrics = self._run_benchmark(test)
+            for name, value in sorted(metrics.items()):
+                self.output.info("{:>14.0f} ns {}".format(value, name))
+            results.update(metrics)
+        return {
+            "context": {
+                "host": platform.node(),
+                "cpus": self.cpus,
+                "fingerprint": host_fingerprint(self.cpus),
+                "repetitions": self.repetitions,
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "unit": "ns",
+            "benchmarks": results,
+        }
+
+# Returns list of (name, baseline, current, change in percent)
+# of metrics that are slower than baseline by more than `threshold` percent
+def find_regressions(results, baseline, threshold):
+    regressions = []
+    for name, value in sorted(results["benchmarks"].items()):
+        baseline_value = baseline.get("benchmarks", {}).get(name)
+        if not baseline_value:
+            continue
+        change = 100.0 * (value - baseline_value) / baseline_value
+        if change > threshold:
+            regressions.append((name, baseline_value, value, change))
+    return regressions
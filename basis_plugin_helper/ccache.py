@@ -0,0 +1,82 @@
+import os, subprocess
+
+# keys of `ccache --print-stats` (ccache >= 3.7),
+# ccache 4.7+ also splits hits by local and remote storage
+HIT_STATS = ("direct_cache_hit", "preprocessed_cache_hit")
+MISS_STATS = ("cache_miss",)
+UNCACHEABLE_STATS = ("called_for_link", "called_for_preprocessing", "compile_failed",
+                     "preprocessor_error", "unsupported_compiler_option",
+                     "unsupported_source_language", "no_input_file",
+                     "could_not_use_precompiled_header", "multiple_source_files",
+                     "autoconf_test", "bad_compiler_arguments", "output_to_stdout")
+
+def default_ccache_dir():
+    home = os.getenv("CONAN_USER_HOME", os.path.expanduser("~"))
+    return os.path.join(home, ".conan", "ccache")
+
+# Directory that contains build folder and packages of all dependencies.
+# Absolute paths below it are rewritten by ccache to paths relative to build folder,
+# so packages built in different conan cache paths (or on different machines)
+# with same relative layout produce same cache keys.
+# Inside conan cache it is `<conan home>/data`.
+def common_base_dir(paths):
+    paths = [os.path.abspath(path) for path in paths if path]
+    if not paths:
+        return None
+    base_dir = os.path.commonpath(paths)
+    if base_dir == os.path.abspath(os.sep):
+        # ccache ignores base_dir "/"
+        return None
+    return base_dir
+
+# see https://ccache.dev/manual/latest.html#_configuration_options
+def ccache_environment(cache_dir, base_dir, max_size = None):
+    env = {
+        "CCACHE_DIR": cache_dir,
+        # build folder path is part of debug info (-g), ignore it in hash,
+        # otherwise same sources in different build folders never hit
+        "CCACHE_NOHASHDIR": "1",
+        # gcc-N from different installations or machines must not
+        # invalidate cache if binary is same
+        "CCACHE_COMPILERCHECK": "content",
+    }
+    if base_dir:
+        env["CCACHE_BASEDIR"] = base_dir
+    if max_size:
+        env["CCACHE_MAXSIZE"] = str(max_size)
+    return env
+
+# Returns dict {name: int} or None if ccache does not support --print-stats
+def read_ccache_stats(ccache_program, env):
+    full_env = os.environ.copy()
+    full_env.update(env)
+    try:
+        output = subprocess.check_output([ccache_program, "--print-stats"],
+                                         env=full_env, stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    stats = {}
+    for line in output.decode("utf-8", "replace").splitlines():
+        name, _, value = line.partition("\t")
+        if value.strip().isdigit():
+            stats[name] = int(value)
+    return stats
+
+# Hits and misses between two `read_ccache_stats` calls.
+# NOTE: cache dir is shared, so stats include compilations
+# of other builds running at same time.
+class CcacheStats:
+    def __init__(self, before, after):
+        def delta(names):
+            return sum(after.get(name, 0) - before.get(name, 0) for name in names)
+        self.hits = delta(HIT_STATS)
+        self.misses = delta(MISS_STATS)
+        self.uncacheable = delta(UNCACHEABLE_STATS)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return 100.0 * self.hits / total if total else 0.0
+
+    def __str__(self):
+        return "{} hits, {} misses ({:.1f}% hit rate), {} uncacheable calls".format(
+            self.hits, self.misses, self.hit_rate(), self.uncacheable)
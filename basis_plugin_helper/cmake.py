@@ -1,15 +1,61 @@
-from conans import ConanFile, CMake, tools, AutoToolsBuildEnvironment, RunEnvironment, python_requires
+# NOTE: CMake, AutoToolsBuildEnvironment, RunEnvironment, os_info, collect_libs, OSInfo
+# and stdlib modules are not used here, they are re-exported for recipes
+# that use them via python_requires module (`base.CMake(self)`, `base.shutil`, etc.)
+from conans import ConanFile, CMake, tools, AutoToolsBuildEnvironment, RunEnvironment
 from conans.errors import ConanInvalidConfiguration, ConanException
-from conans.tools import os_info
-import os, re, stat, fnmatch, platform, glob, traceback, shutil
+from conans.tools import os_info, collect_libs, OSInfo
+import os, re, stat, fnmatch, platform, glob, traceback, shutil, time
 from functools import total_ordering
-from conans.tools import collect_libs
-from conans.tools import OSInfo
-from basis_plugin_helper.headeronly import package_headers
+from contextlib import contextmanager
+from basis_plugin_helper.fileutils import load_json, save_json
+from basis_plugin_helper.timeline import Timeline, timed_stage
 from basis_plugin_helper.require_scm import RequireScm
 
-# if you using python less than 3 use from distutils import strtobool
-from distutils.util import strtobool
+# NOTE: recipes that use python_requires load this module many times per graph,
+# so modules required only by some stages (tests, imports, etc.)
+# are imported inside methods that use them.
+# Names of these modules that were re-exported by this module
+# are still available as module attributes, they are imported on first access.
+LAZY_REEXPORTS = {
+    "python_requires": "conans",
+    "package_headers": "basis_plugin_helper.headeronly",
+    "BuildJobs": "basis_plugin_helper.jobs",
+    "ConfigureCache": "basis_plugin_helper.configure_cache",
+    "TestRunner": "basis_plugin_helper.test_runner",
+    "discover_ctest_tests": "basis_plugin_helper.test_runner",
+    "write_json_report": "basis_plugin_helper.test_runner",
+    "write_junit_report": "basis_plugin_helper.test_runner",
+    "import_files": "basis_plugin_helper.imports",
+    "RUNTIME_IMPORTS": "basis_plugin_helper.imports",
+    "STATIC_LIBRARY_IMPORTS": "basis_plugin_helper.imports",
+    "shared_library_dirs": "basis_plugin_helper.runtime_libs",
+    "build_library_farm": "basis_plugin_helper.runtime_libs",
+    "default_library_farm_dir": "basis_plugin_helper.runtime_libs",
+}
+
+# python_requires exists only while conan loads recipes,
+# AttributeError outside of conan loader
+def __getattr__(name):
+    if name not in LAZY_REEXPORTS:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    import importlib
+    value = getattr(importlib.import_module(LAZY_REEXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+# same as distutils.util.strtobool,
+# distutils is slow to import and deprecated since python 3.10
+#   True values are y, yes, t, true, on and 1;
+#   False values are n, no, f, false, off and 0.
+#   Raises ValueError if val is anything else.
+def strtobool(val):
+    val = val.lower()
+    if val in ('y', 'yes', 't', 'true', 'on', '1'):
+        return 1
+    elif val in ('n', 'no', 'f', 'false', 'off', '0'):
+        return 0
+    else:
+        raise ValueError("invalid truth value %r" % (val,))
 
 # conan runs the methods in this order:
 # config_options(),
@@ -106,10 +152,109 @@ class CMakePackage(ConanFile, RequireScm):
                        "scripts/*", "tools/*", "codegen/*", "assets/*",
                        "docs/*", "licenses/*", "conf/*", "patches/*", "resources/*",
                        "submodules/*", "thirdparty/*", "third-party/*",
-                       "third_party/*", "version.hpp.in")
+                       "third_party/*", "version.hpp.in", "pgo/*")
 
     plugin_settings = "os_build", "os", "arch", "compiler", "build_type", "arch_build"
 
+    # list of libraries stored in package by `plugin_package`,
+    # so `plugin_package_info` does not need to scan lib dir
+    plugin_libs_manifest = "basis_plugin_helper_libs.json"
+
+    # options that do not change compiled binaries (docs, tests, etc.),
+    # variants that differ only by them share build folder, see `plugin_build_id`
+    plugin_build_only_options = ()
+
+    # environ toggles that change produced binaries,
+    # so variants built with different values must get different package_id
+    # (name -> default value, see `_environ_option`)
+    plugin_binary_environ_options = {
+        "ENABLE_LTO": 'false',
+        "USE_COVERAGE": 'false',
+        "COMPILE_WITH_LLVM_TOOLS": 'false',
+        "ENABLE_RUNPATH": 'false',
+        "ENABLE_SPLIT_DWARF": 'false',
+        "ENABLE_COMPRESSED_DEBUG_SECTIONS": 'false',
+        "ENABLE_PGO": 'false',
+        "ENABLE_PLUGIN_EXPORT_MAP": 'false',
+    }
+
+    # build-only environ toggles, produced binaries stay the same,
+    # so they are NOT part of package_id
+    plugin_build_environ_options = {
+        "ENABLE_TESTS": 'true',
+        "ENABLE_BENCHMARK": 'false',
+        "BUILD_DOXY_DOC": 'false',
+        "ENABLE_LLVM_TOOLS": 'false',
+        "ENABLE_LWYU": 'false',
+        "USE_CCACHE": 'false',
+        "ENABLE_CPPCHECK": 'false',
+        "ENABLE_CLANG_TIDY": 'false',
+        "ENABLE_CLANG_FORMAT": 'false',
+        "ENABLE_UNCRUSTIFY": 'false',
+        "ENABLE_IWYU": 'false',
+        "ENABLE_CPPCLEAN": 'false',
+        "FORCE_CMAKE_CONFIGURE": 'false',
+        "ENABLE_PARALLEL_TESTS": 'true',
+        "FORCE_TESTS": 'false',
+        "IMPORT_STATIC_LIBS": 'false',
+        "ENABLE_PCH": 'false',
+        "ENABLE_UNITY_BUILD": 'false',
+        "FORCE_PGO_TRAINING": 'false',
+        "ENABLE_ANALYSIS_STAGE": 'false',
+        "FORCE_ANALYSIS": 'false',
+    }
+
+    # linker used by plugin libraries: bfd, gold, lld or mold,
+    # overridden by PLUGIN_LINKER environ variable (None for compiler default)
+    plugin_linker = None
+
+    plugin_supported_linkers = ("bfd", "gold", "lld", "mold")
+
+    # target built to train instrumented build if ENABLE_PGO is set
+    # (for example "{name}_run_all_benchmarks"),
+    # overridden by PGO_TRAINING_TARGET environ variable,
+    # None runs CTest tests (requires ENABLE_TESTS)
+    plugin_pgo_training_target = None
+
+    # regression of benchmark metric (in percent) compared to baseline
+    # that fails build or prints warning (see BENCHMARK_REGRESSION_ACTION),
+    # overridden by BENCHMARK_REGRESSION_THRESHOLD environ variable
+    plugin_benchmark_regression_threshold = 10
+
+    # benchmark results in package, used as baseline by later builds
+    plugin_benchmark_results = "benchmarks/benchmark_results.json"
+
+    # size limit of shared ccache dir if USE_CCACHE is set,
+    # overridden by CCACHE_MAXSIZE environ variable
+    plugin_ccache_max_size = "20G"
+
+    # headers precompiled for plugin libraries if ENABLE_PCH is set,
+    # None uses COMMON_PLUGIN_PCH_HEADERS from Findbasis_plugin_helper.cmake
+    # (empty by default, set `{target}_PCH_HEADERS` in CMakeLists.txt)
+    plugin_pch_headers = None
+
+    # number of sources combined into single unity source if ENABLE_UNITY_BUILD is set,
+    # overridden by UNITY_BUILD_BATCH_SIZE environ variable
+    plugin_unity_build_batch_size = 8
+
+    # coverage summary in package if USE_COVERAGE is set
+    plugin_coverage_summary = "coverage/coverage_summary.json"
+
+    # sources excluded from coverage report
+    # (fnmatch patterns of paths relative to source folder),
+    # only sources in source folder are reported
+    plugin_coverage_exclude = tuple(pattern for name in (
+        "tests", "generated", "thirdparty", "third_party", "third-party", "submodules")
+        for pattern in ("{}/*".format(name), "*/{}/*".format(name)))
+
+    # analyzer config files (relative to source folder),
+    # cached analysis results are invalidated if they change
+    plugin_analysis_config_files = (".clang-tidy", "cppcheck_suppressions.txt", "iwyu.imp")
+
+    # sources not analyzed by analysis stage (fnmatch patterns of absolute paths)
+    plugin_analysis_exclude = ("*/CMakeFiles/*", "*/generated/*", "*/thirdparty/*",
+                               "*/third_party/*", "*/third-party/*", "*/submodules/*")
+
     # installs clang 10 from conan
     def _is_llvm_tools_enabled(self):
       return self._environ_option("ENABLE_LLVM_TOOLS", default = 'false')
@@ -150,6 +295,70 @@ class CMakePackage(ConanFile, RequireScm):
     def _is_lto_enabled(self):
       return self._environ_option("ENABLE_LTO", default = 'false')
 
+    # always run `cmake.configure`, even if configure fingerprint is unchanged
+    def _is_force_configure_enabled(self):
+      return self._environ_option("FORCE_CMAKE_CONFIGURE", default = 'false')
+
+    # run CTest tests in parallel instead of `{name}_run_all_tests` target
+    def _is_parallel_tests_enabled(self):
+      return self._environ_option("ENABLE_PARALLEL_TESTS", default = 'true')
+
+    # re-run tests that passed before and did not change
+    def _is_force_tests_enabled(self):
+      return self._environ_option("FORCE_TESTS", default = 'false')
+
+    # import static libraries (*.a) of dependencies in plugin_imports
+    def _is_import_static_libs_enabled(self):
+      return self._environ_option("IMPORT_STATIC_LIBS", default = 'false')
+
+    # embed library dirs of dependencies as RUNPATH at link time
+    def _is_runpath_enabled(self):
+      return self._environ_option("ENABLE_RUNPATH", default = 'false')
+
+    # precompiled headers, see `add_plugin_library`
+    def _is_pch_enabled(self):
+      return self._environ_option("ENABLE_PCH", default = 'false')
+
+    # unity (jumbo) builds, see `add_plugin_library`
+    def _is_unity_build_enabled(self):
+      return self._environ_option("ENABLE_UNITY_BUILD", default = 'false')
+
+    # debug info in .dwo files, see `add_plugin_link_options` and `_package_split_dwarf`
+    def _is_split_dwarf_enabled(self):
+      return self._environ_option("ENABLE_SPLIT_DWARF", default = 'false')
+
+    def _is_compressed_debug_sections_enabled(self):
+      return self._environ_option("ENABLE_COMPRESSED_DEBUG_SECTIONS", default = 'false')
+
+    # profile-guided optimization, see `_prepare_pgo`
+    def _is_pgo_enabled(self):
+      return self._environ_option("ENABLE_PGO", default = 'false')
+
+    # train new profile even if stored profile exists
+    def _is_force_pgo_training_enabled(self):
+      return self._environ_option("FORCE_PGO_TRAINING", default = 'false')
+
+    # run ENABLE_CLANG_TIDY, ENABLE_CPPCHECK, ENABLE_IWYU and ENABLE_CPPCLEAN
+    # as separate stage after compile instead of during compile, see `_run_analysis`
+    def _is_analysis_stage_enabled(self):
+      return self._environ_option("ENABLE_ANALYSIS_STAGE", default = 'false')
+
+    # analyze translation units even if cached results exist
+    def _is_force_analysis_enabled(self):
+      return self._environ_option("FORCE_ANALYSIS", default = 'false')
+
+    # hidden visibility and version script, see `add_plugin_export_map`
+    def _is_plugin_export_map_enabled(self):
+      return self._environ_option("ENABLE_PLUGIN_EXPORT_MAP", default = 'false')
+
+    # NOTE: linker is not part of package_id, binaries are compatible
+    def _linker(self):
+        linker = self._environ_value("PLUGIN_LINKER", self.plugin_linker)
+        if linker and linker not in self.plugin_supported_linkers:
+            raise ConanInvalidConfiguration("unknown PLUGIN_LINKER: %s, use one of %s" % (
+                linker, ", ".join(self.plugin_supported_linkers)))
+        return linker
+
     # sets cmake variables required to use clang 10 from conan
     def _is_compile_with_llvm_tools_enabled(self):
       return self._environ_option("COMPILE_WITH_LLVM_TOOLS", default = 'false')
@@ -157,6 +366,37 @@ class CMakePackage(ConanFile, RequireScm):
     def _verbose_makefile(self):
         return os.environ.get('CONAN_' + self.name.upper() + '_VERBOSE_MAKEFILE') is not None
 
+    def _timeline(self):
+        if getattr(self, "_plugin_timeline", None) is None:
+            self._plugin_timeline = Timeline(self.name)
+        return self._plugin_timeline
+
+    # Timeline is written to build_timeline.json in build folder
+    # and to BUILD_TIMELINE_DIR/{name}.json (if BUILD_TIMELINE_DIR is set),
+    # use BUILD_TIMELINE_DIR to collect timelines of whole dependency graph.
+    def _save_timeline(self):
+        paths = []
+        build_folder = getattr(self, "build_folder", None)
+        if build_folder and os.path.isdir(build_folder):
+            paths.append(os.path.join(build_folder, "build_timeline.json"))
+        timeline_dir = self._environ_value("BUILD_TIMELINE_DIR")
+        if timeline_dir:
+            paths.append(os.path.join(timeline_dir, "{}.json".format(self.name)))
+        for path in paths:
+            self._timeline().save(path)
+
+    # Records wall time, CPU time and peak RSS of stage.
+    # Timeline is saved when outermost stage finishes.
+    @contextmanager
+    def _timed_stage(self, name):
+        timeline = self._timeline()
+        try:
+            with timeline.stage(name):
+                yield
+        finally:
+            if timeline.depth == 0:
+                self._save_timeline()
+
     def plugin_configure(self):
         lower_build_type = str(self.settings.build_type).lower()
 
@@ -169,6 +409,10 @@ class CMakePackage(ConanFile, RequireScm):
         if self._is_compile_with_llvm_tools_enabled() and not self._is_llvm_tools_enabled():
             raise ConanInvalidConfiguration("to compile with llvm_tools you must be enable llvm_tools")
 
+        if self._is_pgo_enabled() and not self._is_tests_enabled() \
+           and not self._pgo_training_target():
+            raise ConanInvalidConfiguration("PGO training requires ENABLE_TESTS or PGO_TRAINING_TARGET")
+
         if self.options.enable_valgrind:
             self.options["basis"].enable_valgrind = True
             self.options["chromium_base"].enable_valgrind = True
@@ -250,9 +494,12 @@ class CMakePackage(ConanFile, RequireScm):
         if self._is_llvm_tools_enabled():
           self.build_requires("llvm_tools/master@conan/stable")
 
+        # ENABLE_TESTS is build-only toggle, test libraries are build requirements
+        # (linked for host, see force_host_context), so they change
+        # neither package_id nor requirements of consumers
         if self._is_tests_enabled():
-            self.requires("catch2/[>=2.1.0]@bincrafters/stable")
-            self.requires("conan_gtest/stable@conan/stable")
+            self.build_requires("catch2/[>=2.1.0]@bincrafters/stable", force_host_context=True)
+            self.build_requires("conan_gtest/stable@conan/stable", force_host_context=True)
             self.build_requires("FakeIt/[>=2.0.5]@gasuketsu/stable")
 
     def plugin_requirements(self):
@@ -293,10 +540,10 @@ class CMakePackage(ConanFile, RequireScm):
 
         return defs
 
-    # build-only option
     # see https://github.com/conan-io/conan/issues/6967
     # conan ignores changes in environ, so
-    # use `conan remove` if you want to rebuild package
+    # toggles from `plugin_binary_environ_options`
+    # are stored in package_id by `plugin_package_id`
     def _environ_option(self, name, default = 'true'):
       env_val = default.lower() # default, must be lowercase!
       # allow both lowercase and uppercase
@@ -311,9 +558,51 @@ class CMakePackage(ConanFile, RequireScm):
       #   see https://docs.python.org/3/distutils/apiref.html#distutils.util.strtobool
       return bool(strtobool(env_val))
 
+    # non-boolean environ option
+    def _environ_value(self, name, default = None):
+      if name.upper() in os.environ:
+        return os.getenv(name.upper())
+      elif name.lower() in os.environ:
+        return os.getenv(name.lower())
+      return default
+
     def _is_tests_enabled(self):
       return self._environ_option("ENABLE_TESTS", default = 'true')
 
+    def _binary_environ_options(self):
+        options = {}
+        for name, default in self.plugin_binary_environ_options.items():
+            options[name] = self._environ_option(name, default = default)
+        return options
+
+    # Stores environ toggles that change binaries in package_id,
+    # so already built variants can be reused from cache or remote
+    # instead of `conan remove` and full rebuild.
+    # Build-only toggles (tests, docs, static analysis, etc.) are ignored.
+    def plugin_package_id(self):
+        for name, value in sorted(self._binary_environ_options().items()):
+            setattr(self.info.options, name.lower(), value)
+
+    # Values of build-only environ toggles and options of current variant
+    def _build_variant_values(self):
+        values = {}
+        for name, default in self.plugin_build_environ_options.items():
+            values[name] = self._environ_option(name, default = default)
+        for name in self.plugin_build_only_options:
+            values["option:" + name] = self.options.get_safe(name)
+        return values
+
+    # Variants that differ only by `plugin_build_only_options`
+    # (and build-only environ toggles, they are not part of package_id)
+    # share one build folder: conan builds first of them
+    # and calls only package() for others, see `plugin_run_pending_stages`.
+    # USAGE:
+    # def build_id(self):
+    #     self.plugin_build_id()
+    def plugin_build_id(self):
+        for name in self.plugin_build_only_options:
+            setattr(self.info_build.options, name, "ANY")
+
     # Use to ensure that you do not package
     # credentials, certs, '.git', tests, etc.
     def rmdir_if_packaged(self, dir_path):
@@ -340,6 +629,588 @@ class CMakePackage(ConanFile, RequireScm):
     def _parallel_build(self):
         return os.environ.get('CONAN_' + self.name.upper() + '_SINGLE_THREAD_BUILD') is None
 
+    # memory usage of compile and link jobs depends on build mode
+    def _build_mode(self):
+        if self._is_lto_enabled():
+            return "lto"
+        if self.options.enable_asan \
+           or self.options.enable_msan \
+           or self.options.enable_tsan \
+           or self.options.enable_ubsan:
+            return "sanitizer"
+        if self._is_coverage_enabled():
+            return "coverage"
+        return "default"
+
+    # Limits number of compile and link jobs by available memory
+    # (respects cgroup limits inside containers).
+    # Ninja job pools allow to limit link jobs separately from compile jobs.
+    def _build_jobs(self, cmake):
+        from basis_plugin_helper.jobs import BuildJobs
+
+        cpu_count = tools.cpu_count() if self._parallel_build() else 1
+        self.output.info('Detected %s CPUs' % (cpu_count))
+        use_job_pools = "Ninja" in str(cmake.generator)
+        return BuildJobs(self._build_mode(), cpu_count, use_job_pools)
+
+    # state of build stages (fingerprints, timings, etc.) stored between builds
+    def _plugin_cache_dir(self):
+        return os.path.join(self.build_folder, ".basis_plugin_helper")
+
+    # package_id of current variant, build folder digest if it is unknown (local build)
+    def _variant_id(self):
+        try:
+            return self.info.package_id()
+        except Exception:
+            from basis_plugin_helper.fileutils import string_digest
+            return string_digest(self.build_folder)[:40]
+
+    # State that must survive cache builds (conan removes build folder before build),
+    # per package and variant (package_id).
+    # PLUGIN_STATE_DIR or dir in conan user home, same as ccache and flextool caches.
+    def _plugin_state_dir(self):
+        home = os.getenv("CONAN_USER_HOME", os.path.expanduser("~"))
+        root = self._environ_value("PLUGIN_STATE_DIR") \
+            or os.path.join(home, ".conan", "basis_plugin_helper")
+        return os.path.join(root, str(self.name), str(self.version), self._variant_id())
+
+    # Skips `cmake.configure` if cmake definitions, generator
+    # and CMake input files did not change since previous configure.
+    # NOTE: fingerprint is stored in build folder next to CMakeCache.txt,
+    # conan removes build folder before cache builds, so skip works only
+    # for local builds (`conan build`), never in `conan create`.
+    def _configure_if_changed(self, cmake):
+        from basis_plugin_helper.configure_cache import ConfigureCache
+        from basis_plugin_helper.jobs import job_pools_fit
+
+        configure_cache = ConfigureCache(self._plugin_cache_dir(),
+            os.path.join(self.source_folder, self.plugin_source_subfolder),
+            self.build_folder)
+        fingerprint = configure_cache.fingerprint(cmake)
+
+        if self._is_force_configure_enabled():
+            reasons = ["FORCE_CMAKE_CONFIGURE is enabled"]
+        else:
+            # job pools of previous configure are kept while they fit
+            # into memory of current machine, larger pools cause reconfigure
+            reasons = configure_cache.changes(fingerprint,
+                compatible = {"CMAKE_JOB_POOLS": job_pools_fit})
+
+        if not reasons:
+            self.output.info('Configure fingerprint unchanged, skipping cmake configure')
+            return
+
+        for reason in reasons:
+            self.output.info('Running cmake configure: %s' % (reason))
+
+        # fingerprint must not survive failed configure
+        configure_cache.invalidate()
+        with self._timed_stage("cmake_configure"):
+            # The CMakeLists.txt file must be in `source_folder`
+            cmake.configure(source_folder=self.plugin_source_subfolder)
+        configure_cache.save(fingerprint)
+
+    # Returns (ccache program, environ) if USE_CCACHE is set.
+    # All packages use one shared cache dir (CCACHE_DIR or dir in conan user home)
+    # and paths relative to CCACHE_BASEDIR (common dir of build folder and dependencies),
+    # so variants and packages built in different folders share cache entries.
+    def _ccache(self):
+        from basis_plugin_helper.ccache import ccache_environment, \
+            common_base_dir, default_ccache_dir
+
+        if not self._is_ccache_enabled():
+            return None
+        ccache_program = tools.which("ccache")
+        if not ccache_program:
+            self.output.warn('USE_CCACHE is enabled, but ccache is not found')
+            return None
+        base_dir = self._environ_value("CCACHE_BASEDIR") or common_base_dir(
+            [self.build_folder, self.source_folder]
+            + [self.deps_cpp_info[dep_name].rootpath for dep_name in self.deps_cpp_info.deps])
+        env = ccache_environment(
+            self._environ_value("CCACHE_DIR") or default_ccache_dir(),
+            base_dir,
+            self._environ_value("CCACHE_MAXSIZE", self.plugin_ccache_max_size))
+        return ccache_program, env
+
+    def _report_ccache_stats(self, ccache_program, ccache_env, stats_before):
+        from basis_plugin_helper.ccache import CcacheStats, read_ccache_stats
+
+        stats_after = read_ccache_stats(ccache_program, ccache_env)
+        if stats_before is None or stats_after is None:
+            self.output.warn('ccache does not support --print-stats, hit rate is unknown')
+            return
+        stats = CcacheStats(stats_before, stats_after)
+        self.output.info('ccache: %s' % (stats))
+
+    # Prints slowest link steps of build (Ninja generator only)
+    # and compares them with previous builds that used other linker
+    # or debug info mode in same build folder.
+    def _report_link_times(self, ninja_log, ninja_log_offset):
+        from basis_plugin_helper.link_times import LinkTimes, ninja_link_steps
+
+        steps = ninja_link_steps(ninja_log, ninja_log_offset)
+        if not steps:
+            return
+        config = "linker={} split_dwarf={} compressed_debug={}".format(
+            self._linker() or "default",
+            self._is_split_dwarf_enabled(),
+            self._is_compressed_debug_sections_enabled())
+        link_times = LinkTimes(self._plugin_cache_dir())
+        for line in link_times.report(config, steps):
+            self.output.info(line)
+        link_times.record(config, steps)
+
+    def _pgo_training_target(self):
+        target = self._environ_value("PGO_TRAINING_TARGET", self.plugin_pgo_training_target)
+        if target:
+            return target.format(name=self.name)
+        return None
+
+    def _pgo_dir(self):
+        return os.path.join(self._plugin_cache_dir(), "pgo")
+
+    # trained profile kept between cache builds of same package_id
+    def _pgo_store_dir(self):
+        return os.path.join(self._plugin_state_dir(), "pgo")
+
+    def _is_clang(self):
+        return str(self.settings.compiler) in ("clang", "apple-clang") \
+            or self._is_compile_with_llvm_tools_enabled()
+
+    # First existing profile of:
+    #   PGO_PROFILE_DIR environ variable,
+    #   pgo/ in source folder (exported with recipe, copy it from package),
+    #   profile trained by previous build of same package_id (see `_pgo_store_dir`,
+    #   conan removes build folder before cache build),
+    #   profile trained by previous build in same build folder
+    def _stored_pgo_profile(self):
+        from basis_plugin_helper.pgo import has_profile
+
+        candidates = [
+            self._environ_value("PGO_PROFILE_DIR"),
+            os.path.join(self.source_folder, self.plugin_source_subfolder, "pgo"),
+            self._pgo_store_dir(),
+            os.path.join(self._pgo_dir(), "trained"),
+        ]
+        for profile_dir in candidates:
+            if has_profile(profile_dir):
+                return profile_dir
+        return None
+
+    # Instrumented build and training run,
+    # profile is merged into `trained` dir of `_pgo_dir`
+    def _train_pgo_profile(self, cmake, jobs):
+        from basis_plugin_helper.pgo import merge_profiles, has_profile, copy_profile
+
+        raw_dir = os.path.join(self._pgo_dir(), "raw")
+        trained_dir = os.path.join(self._pgo_dir(), "trained")
+        # profiles of previous instrumented builds do not match new objects
+        tools.rmdir(raw_dir)
+
+        llvm_profdata = None
+        if self._is_clang():
+            llvm_profdata = tools.which("llvm-profdata")
+            if not llvm_profdata:
+                raise ConanException("llvm-profdata is required to merge PGO profiles")
+
+        self.output.info('Building instrumented build for PGO training')
+        cmake.definitions["PGO_MODE"] = "generate"
+        cmake.definitions["PGO_PROFILE_DIR"] = raw_dir
+        with self._timed_stage("pgo_instrumented_build"):
+            self._configure_if_changed(cmake)
+            cmake.build(args=["--", "-j%s" % jobs.build_jobs])
+
+        with self._timed_stage("pgo_training"):
+            training_target = self._pgo_training_target()
+            if training_target:
+                self.output.info('Training PGO profile using %s target' % (training_target))
+                cmake.build(args=["--target", training_target, "--", "-j%s" % jobs.build_jobs])
+            else:
+                self._run_pgo_training_tests(jobs)
+
+        merge_profiles(raw_dir, trained_dir, llvm_profdata)
+        if not has_profile(trained_dir):
+            raise ConanException("PGO training did not produce profile in %s" % (raw_dir))
+        copy_profile(trained_dir, self._pgo_store_dir())
+        self.output.info('Stored PGO profile in %s' % (self._pgo_store_dir()))
+
+    def _run_pgo_training_tests(self, jobs):
+        from basis_plugin_helper.test_runner import TestRunner, discover_ctest_tests
+
+        tests, missing = discover_ctest_tests(self.build_folder,
+            tools.which("ctest") or "ctest")
+        if missing:
+            self.output.warn('Tests are not built: %s' % (", ".join(missing)))
+        self.output.info('Training PGO profile using %s tests' % (len(tests)))
+        # separate cache dir, results of instrumented build must not skip real tests
+        runner = TestRunner(self.output, self.build_folder, self._pgo_dir(),
+            jobs.compile_jobs, use_cache = False,
+            default_timeout = self._environ_value("TEST_TIMEOUT"))
+        failed = [result["name"] for result in runner.run(tests) if result["status"] != "passed"]
+        if failed:
+            self.output.warn('%s PGO training tests failed: %s' % (len(failed), ", ".join(failed)))
+
+    # Three-phase build if ENABLE_PGO is set:
+    # instrumented build, training run and optimized build using merged profile.
+    # First two phases are skipped if stored profile exists (see `_stored_pgo_profile`).
+    # Profile used by optimized build is packaged into pgo/.
+    def _prepare_pgo(self, cmake, jobs):
+        from basis_plugin_helper.pgo import copy_profile, profile_digest
+
+        profile_dir = self._stored_pgo_profile()
+        if profile_dir is None or self._is_force_pgo_training_enabled():
+            self._train_pgo_profile(cmake, jobs)
+            profile_dir = os.path.join(self._pgo_dir(), "trained")
+        else:
+            self.output.info('Using stored PGO profile from %s' % (profile_dir))
+
+        # profile path is part of compile flags,
+        # so objects are rebuilt when profile changes
+        used_dir = os.path.join(self._pgo_dir(), "use-" + profile_digest(profile_dir)[:16])
+        if not os.path.isdir(used_dir):
+            if os.path.isdir(self._pgo_dir()):
+                for name in os.listdir(self._pgo_dir()):
+                    if name.startswith("use-"):
+                        tools.rmdir(os.path.join(self._pgo_dir(), name))
+            copy_profile(profile_dir, used_dir)
+        save_json(os.path.join(self._pgo_dir(), "profile.json"), {"dir": used_dir})
+
+        cmake.definitions["PGO_MODE"] = "use"
+        cmake.definitions["PGO_PROFILE_DIR"] = used_dir
+
+    def _package_pgo_profile(self):
+        profile = load_json(os.path.join(self._pgo_dir(), "profile.json"))
+        if profile is not None:
+            self.copy("*", dst="pgo", src=profile["dir"])
+
+    # Debug info of split DWARF is in .dwo files of build folder, not in binaries.
+    # Each packaged executable and shared library gets `<binary>.dwp`
+    # (found by gdb near binary) made by dwp from its .dwo files.
+    # .dwo files are packaged to `dwo` dir if dwp is not found or fails
+    # and for static libraries (dwp does not read archives).
+    def _package_split_dwarf(self):
+        import subprocess
+        from basis_plugin_helper.fileutils import is_elf_file
+
+        # llvm-dwp supports DWARF 5 (default of GCC 11+)
+        dwp = tools.which("llvm-dwp") or tools.which("dwp")
+        package_dwo = not dwp
+        if not dwp:
+            self.output.warn('ENABLE_SPLIT_DWARF is enabled, but dwp is not found, packaging .dwo files')
+        binaries = []
+        for folder in ("bin", "lib"):
+            for root, _, files in os.walk(os.path.join(self.package_folder, folder)):
+                binaries.extend(os.path.join(root, name) for name in sorted(files))
+                package_dwo = package_dwo or any(name.endswith(".a") for name in files)
+        for binary in binaries:
+            if not dwp or not is_elf_file(binary):
+                continue
+            # .dwo paths are relative to build folder if debug prefix is mapped
+            process = subprocess.run([dwp, "-e", binary, "-o", binary + ".dwp"],
+                cwd=self.build_folder, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            if process.returncode != 0:
+                self.output.warn('dwp failed for %s: %s' % (
+                    os.path.relpath(binary, self.package_folder),
+                    process.stdout.decode("utf-8", "replace").strip()))
+                if os.path.exists(binary + ".dwp"):
+                    os.remove(binary + ".dwp")
+                package_dwo = True
+        if package_dwo:
+            self.copy("*.dwo", dst="dwo", keep_path=True)
+
+    # Cache of flextool outputs shared by all packages
+    # (FLEXTOOL_CACHE_DIR or dir in conan user home), see `add_flextool_command`
+    def _flextool_cache_dir(self):
+        home = os.getenv("CONAN_USER_HOME", os.path.expanduser("~"))
+        return self._environ_value("FLEXTOOL_CACHE_DIR") \
+            or os.path.join(home, ".conan", "flextool_cache")
+
+    def _run_all_tests_target(self, cmake, jobs):
+        self.output.info('Running tests')
+        if self._is_coverage_enabled() and self._is_clang():
+            self.output.warn('Raw profiles of tests are collected only by parallel tests '
+                             '(ENABLE_PARALLEL_TESTS), coverage stage will not find them')
+        cmake.build(args=["--target", \
+          "{}_run_all_tests".format(self.name), \
+          "--", "-j%s" % jobs.build_jobs])
+
+    # Runs CTest tests in parallel, slowest first,
+    # skips unchanged tests that passed before
+    # and writes test_report.json and test_report.xml (JUnit) to build folder.
+    # Set TEST_TOTAL_SHARDS and TEST_SHARD_INDEX to split tests between machines.
+    def _run_tests(self, cmake, jobs):
+        from basis_plugin_helper.test_runner import TestRunner, discover_ctest_tests, \
+            write_json_report, write_junit_report
+
+        if not self._is_parallel_tests_enabled():
+            self._run_all_tests_target(cmake, jobs)
+            return
+
+        from basis_plugin_helper.benchmark_runner import is_benchmark
+
+        tests, missing = discover_ctest_tests(self.build_folder,
+            tools.which("ctest") or "ctest")
+        if missing:
+            self.output.warn('Tests are not built: %s' % (", ".join(missing)))
+        if missing or not tests:
+            self._run_all_tests_target(cmake, jobs)
+            return
+        # benchmarks are run by `_run_benchmarks`
+        tests = [test for test in tests if not is_benchmark(test)]
+
+        before_test = None
+        if self._is_coverage_enabled() and self._is_clang():
+            from basis_plugin_helper.coverage import raw_profile_pattern, remove_raw_profiles
+            # raw profile per test, see `_run_coverage`
+            raw_dir = self._coverage_raw_dir()
+            for test in tests:
+                test.environment["LLVM_PROFILE_FILE"] = raw_profile_pattern(raw_dir, test)
+            before_test = lambda test: remove_raw_profiles(raw_dir, test)
+
+        test_jobs = int(self._environ_value("TEST_JOBS", jobs.compile_jobs))
+        # passed tests and timings are kept between cache builds
+        runner = TestRunner(self.output, self.build_folder,
+            os.path.join(self._plugin_state_dir(), "tests"),
+            test_jobs,
+            shard_index = int(self._environ_value("TEST_SHARD_INDEX", 0)),
+            total_shards = int(self._environ_value("TEST_TOTAL_SHARDS", 1)),
+            use_cache = not self._is_force_tests_enabled(),
+            default_timeout = self._environ_value("TEST_TIMEOUT"),
+            before_test = before_test,
+            # rebuilt dependencies invalidate cached results
+            library_dirs = list(self.deps_cpp_info.lib_paths) + list(self.deps_cpp_info.bin_paths),
+            ctest_program = tools.which("ctest") or "ctest")
+        self.output.info('Running %s tests using %s jobs' % (len(tests), test_jobs))
+        with self._timed_stage("tests"):
+            results = runner.run(tests)
+
+        write_json_report(results, os.path.join(self.build_folder, "test_report.json"))
+        write_junit_report(results, os.path.join(self.build_folder, "test_report.xml"), self.name)
+
+        failed = [result["name"] for result in results if result["status"] in ("failed", "timeout")]
+        if failed:
+            raise ConanException("%s tests failed: %s" % (len(failed), ", ".join(failed)))
+
+    # Returns analyzers enabled by ENABLE_CLANG_TIDY, ENABLE_CPPCHECK, etc.
+    # clang-tidy and include-what-you-use are searched in llvm_tools first.
+    # Program can be set by environ variable (CLANG_TIDY_PROGRAM, etc.),
+    # extra arguments by CLANG_TIDY_ARGS, CPPCHECK_ARGS, IWYU_ARGS, CPPCLEAN_ARGS.
+    def _analyzers(self):
+        from basis_plugin_helper.analysis import ANALYZERS
+        import shlex
+
+        llvm_tools_bin_paths = list(self.deps_cpp_info["llvm_tools"].bin_paths) \
+            if "llvm_tools" in self.deps_cpp_info.deps else []
+        enabled = [
+            ("clang-tidy", "CLANG_TIDY", "clang-tidy", self._is_clang_tidy_enabled()),
+            ("cppcheck", "CPPCHECK", "cppcheck", self._is_cppcheck_enabled()),
+            ("iwyu", "IWYU", "include-what-you-use", self._is_iwyu_enabled()),
+            ("cppclean", "CPPCLEAN", "cppclean", self._is_cppclean_enabled()),
+        ]
+        analyzers = []
+        for name, environ_name, program_name, is_enabled in enabled:
+            if not is_enabled:
+                continue
+            program = self._environ_value(environ_name + "_PROGRAM")
+            for bin_path in llvm_tools_bin_paths:
+                if not program and os.path.isfile(os.path.join(bin_path, program_name)):
+                    program = os.path.join(bin_path, program_name)
+            program = program or tools.which(program_name)
+            if not program:
+                raise ConanInvalidConfiguration("%s is enabled, but %s is not found" % (name, program_name))
+            args = shlex.split(self._environ_value(environ_name + "_ARGS", ""))
+            analyzers.append(ANALYZERS[name](name, program, args))
+        return analyzers
+
+    # Runs enabled analyzers on translation units from compile_commands.json
+    # in parallel (ANALYSIS_JOBS, default: number of compile jobs).
+    # Results are cached per translation unit (in ANALYSIS_CACHE_DIR
+    # or dir in conan user home), only changed translation units are analyzed again.
+    # Writes analysis_report.json to build folder,
+    # findings fail build if ANALYSIS_ACTION is "fail" (default: "warn").
+    def _run_analysis(self, jobs):
+        from basis_plugin_helper.analysis import AnalysisRunner, default_analysis_cache_dir, \
+            load_compile_commands, filter_compile_commands, write_analysis_report
+
+        analyzers = self._analyzers()
+        if not analyzers:
+            self.output.warn('ENABLE_ANALYSIS_STAGE is set, but no analyzer is enabled')
+            return
+        compile_commands_path = os.path.join(self.build_folder, "compile_commands.json")
+        if not os.path.isfile(compile_commands_path):
+            raise ConanException("analysis stage requires %s" % (compile_commands_path))
+        compile_commands = filter_compile_commands(
+            load_compile_commands(compile_commands_path), self.plugin_analysis_exclude)
+
+        source_folder = os.path.join(self.source_folder, self.plugin_source_subfolder)
+        analysis_jobs = int(self._environ_value("ANALYSIS_JOBS", jobs.compile_jobs))
+        runner = AnalysisRunner(self.output, self.build_folder,
+            self._environ_value("ANALYSIS_CACHE_DIR") or default_analysis_cache_dir(),
+            analysis_jobs,
+            config_files = [os.path.join(source_folder, path)
+                            for path in self.plugin_analysis_config_files],
+            use_cache = not self._is_force_analysis_enabled())
+        self.output.info('Analyzing %s translation units with %s using %s jobs' % (
+            len(compile_commands), ", ".join(analyzer.name for analyzer in analyzers), analysis_jobs))
+        with self._timed_stage("analysis"):
+            results = runner.run(analyzers, compile_commands)
+
+        write_analysis_report(results, os.path.join(self.build_folder, "analysis_report.json"))
+
+        cached = [result for result in results if result["status"] == "cached"]
+        findings = [result for result in results if result["findings"]]
+        self.output.info('Analysis: %s results, %s cached, %s with findings' % (
+            len(results), len(cached), len(findings)))
+        for result in findings:
+            self.output.warn('%s: %s\n%s' % (result["analyzer"], result["file"], result["output"]))
+        action = self._environ_value("ANALYSIS_ACTION", "warn")
+        if findings and action == "fail":
+            raise ConanException("%s analysis findings" % (len(findings)))
+
+    def _coverage_dir(self):
+        return os.path.join(self._plugin_cache_dir(), "coverage")
+
+    def _coverage_raw_dir(self):
+        return os.path.join(self._coverage_dir(), "raw")
+
+    # gcov of compiler (GCOV environ variable overrides it)
+    def _gcov_command(self):
+        gcov = self._environ_value("GCOV")
+        if gcov:
+            return gcov.split()
+        if self._is_clang():
+            return [tools.which("llvm-cov") or "llvm-cov", "gcov"]
+        return [tools.which("gcov-{}".format(self.settings.compiler.version))
+                or tools.which("gcov") or "gcov"]
+
+    # Collects coverage of tests in parallel (COVERAGE_JOBS, default: number of compile jobs):
+    # .gcda files of object files (gcov) or raw profiles of test executables
+    # (Clang source-based coverage, merged by llvm-profdata).
+    # Only object files and test executables with changed counters are processed again.
+    # Writes coverage.info (lcov tracefile) and coverage_summary.json to build folder,
+    # summary is packaged (see `plugin_coverage_summary`).
+    def _run_coverage(self, jobs):
+        from basis_plugin_helper.coverage import CoverageCollector, \
+            coverage_summary, filter_line_counts, has_raw_profiles, write_lcov
+        from basis_plugin_helper.test_runner import SHARED_LIBRARY_EXTENSIONS
+
+        coverage_jobs = int(self._environ_value("COVERAGE_JOBS", jobs.compile_jobs))
+        collector = CoverageCollector(self.output, self.build_folder,
+            os.path.join(self._coverage_dir(), "results"), coverage_jobs)
+        with self._timed_stage("coverage"):
+            if has_raw_profiles(self._coverage_raw_dir()):
+                # plugins loaded by tests
+                objects = []
+                for root, dirs, files in os.walk(self.build_folder):
+                    dirs[:] = [name for name in dirs if name not in ("CMakeFiles", ".basis_plugin_helper")]
+                    objects.extend(os.path.join(root, name) for name in sorted(files)
+                                   if name.endswith(SHARED_LIBRARY_EXTENSIONS))
+                line_counts = collector.collect_llvm(
+                    tools.which("llvm-profdata") or "llvm-profdata",
+                    tools.which("llvm-cov") or "llvm-cov",
+                    self._coverage_raw_dir(), objects)
+            else:
+                line_counts = collector.collect_gcov(self._gcov_command())
+            collector.prune()
+
+        # summary of previous run must not be packaged
+        summary_path = os.path.join(self.build_folder, "coverage_summary.json")
+        if os.path.exists(summary_path):
+            os.remove(summary_path)
+        if not line_counts:
+            self.output.warn('No coverage data found (.gcda files or raw profiles of tests), '
+                             'coverage report is not written')
+            return
+
+        source_folder = os.path.join(self.source_folder, self.plugin_source_subfolder)
+        line_counts = filter_line_counts(line_counts, source_folder, self.plugin_coverage_exclude)
+        write_lcov(line_counts, os.path.join(self.build_folder, "coverage.info"))
+        summary = coverage_summary(line_counts)
+        save_json(summary_path, summary)
+        self.output.info('Line coverage: %s%% (%s of %s lines in %s files)' % (
+            summary["percent"], summary["covered"], summary["lines"], len(summary["files"])))
+
+    # First existing baseline of:
+    #   BENCHMARK_BASELINE environ variable (path to results file),
+    #   benchmarks/benchmark_results.json in source folder (exported with recipe),
+    #   results of previous build of same package_id (see `_plugin_state_dir`,
+    #   package and build folders are removed before cache build)
+    def _benchmark_baseline(self):
+        candidates = [
+            self._environ_value("BENCHMARK_BASELINE"),
+            os.path.join(self.source_folder, self.plugin_source_subfolder,
+                         self.plugin_benchmark_results),
+            os.path.join(self._plugin_state_dir(), "benchmark_results.json"),
+        ]
+        for path in candidates:
+            if path and os.path.isfile(path):
+                return path
+        return None
+
+    # Runs benchmarks registered by `add_plugin_benchmark` one by one,
+    # pinned to BENCHMARK_CPUS (taskset --cpu-list format) if set.
+    # Results are written to benchmark_results.json in build folder,
+    # packaged and compared with baseline (see `_benchmark_baseline`).
+    def _run_benchmarks(self):
+        from basis_plugin_helper.test_runner import discover_ctest_tests
+        from basis_plugin_helper.benchmark_runner import BenchmarkRunner, \
+            is_benchmark, find_regressions, host_differences
+
+        tests, missing = discover_ctest_tests(self.build_folder,
+            tools.which("ctest") or "ctest")
+        if missing:
+            # labels of tests that are not built are unknown
+            self.output.warn('Tests are not built, benchmarks among them are not run: %s' % (
+                ", ".join(missing)))
+        benchmarks = [test for test in tests if is_benchmark(test)]
+        if not benchmarks:
+            self.output.warn('No benchmarks found, register them using add_plugin_benchmark')
+            return
+
+        cpus = self._environ_value("BENCHMARK_CPUS")
+        if cpus and not tools.which("taskset"):
+            raise ConanException("BENCHMARK_CPUS requires taskset")
+        if not cpus:
+            self.output.warn('BENCHMARK_CPUS is not set, benchmarks are not pinned to isolated CPUs')
+
+        baseline_path = self._benchmark_baseline()
+        # load before results of this build overwrite it
+        baseline = load_json(baseline_path) if baseline_path else None
+
+        runner = BenchmarkRunner(self.output,
+            os.path.join(self._plugin_cache_dir(), "benchmarks"),
+            repetitions = int(self._environ_value("BENCHMARK_REPETITIONS", 5)),
+            cpus = cpus,
+            default_timeout = self._environ_value("TEST_TIMEOUT"))
+        self.output.info('Running %s benchmarks' % (len(benchmarks)))
+        with self._timed_stage("benchmarks"):
+            results = runner.run(benchmarks)
+        save_json(os.path.join(self.build_folder, "benchmark_results.json"), results)
+        save_json(os.path.join(self._plugin_state_dir(), "benchmark_results.json"), results)
+
+        if baseline is None:
+            self.output.info('No benchmark baseline found')
+            return
+        differences = host_differences(results, baseline)
+        if differences:
+            self.output.warn('Benchmark baseline %s was recorded on other machine (%s differ), '
+                             'comparison is skipped' % (baseline_path, ", ".join(differences)))
+            return
+        threshold = float(self._environ_value("BENCHMARK_REGRESSION_THRESHOLD",
+            self.plugin_benchmark_regression_threshold))
+        regressions = find_regressions(results, baseline, threshold)
+        self.output.info('Compared benchmarks with baseline %s' % (baseline_path))
+        if not regressions:
+            return
+        lines = ["%s: %.0f ns -> %.0f ns (+%.1f%%)" % regression for regression in regressions]
+        message = "%s benchmarks regressed by more than %s%%:\n%s" % (
+            len(regressions), threshold, "\n".join(lines))
+        action = self._environ_value("BENCHMARK_REGRESSION_ACTION", "warn")
+        if action == "fail":
+            raise ConanException(message)
+        self.output.warn(message)
+
     def plugin_cmake_definitions(self, cmake):
         cmake.definitions["CMAKE_TOOLCHAIN_FILE"] = 'conan_paths.cmake'
 
@@ -376,66 +1247,275 @@ class CMakePackage(ConanFile, RequireScm):
 
         self.add_cmake_option(cmake, "USE_CCACHE", self._is_ccache_enabled())
 
-        self.add_cmake_option(cmake, "ENABLE_CPPCHECK", self._is_cppcheck_enabled())
+        # analysis stage runs analyzers after compile,
+        # they are not wired into compile of plugin libraries
+        compile_time_analysis = not self._is_analysis_stage_enabled()
+        if self._is_analysis_stage_enabled():
+            cmake.definitions["CMAKE_EXPORT_COMPILE_COMMANDS"] = "ON"
+
+        self.add_cmake_option(cmake, "ENABLE_CPPCHECK", self._is_cppcheck_enabled() and compile_time_analysis)
 
-        self.add_cmake_option(cmake, "ENABLE_CLANG_TIDY", self._is_clang_tidy_enabled())
+        self.add_cmake_option(cmake, "ENABLE_CLANG_TIDY", self._is_clang_tidy_enabled() and compile_time_analysis)
 
         self.add_cmake_option(cmake, "ENABLE_CLANG_FORMAT", self._is_clang_format_enabled())
 
         self.add_cmake_option(cmake, "ENABLE_UNCRUSTIFY", self._is_uncrustify_enabled())
 
-        self.add_cmake_option(cmake, "ENABLE_IWYU", self._is_iwyu_enabled())
+        self.add_cmake_option(cmake, "ENABLE_IWYU", self._is_iwyu_enabled() and compile_time_analysis)
 
-        self.add_cmake_option(cmake, "ENABLE_CPPCLEAN", self._is_cppclean_enabled())
+        self.add_cmake_option(cmake, "ENABLE_CPPCLEAN", self._is_cppclean_enabled() and compile_time_analysis)
 
         self.add_cmake_option(cmake, "ENABLE_LTO", self._is_lto_enabled())
 
+        self.add_cmake_option(cmake, "ENABLE_PCH", self._is_pch_enabled())
+        if self._is_pch_enabled() and self.plugin_pch_headers is not None:
+            cmake.definitions["COMMON_PLUGIN_PCH_HEADERS"] = ";".join(self.plugin_pch_headers)
+
+        self.add_cmake_option(cmake, "ENABLE_UNITY_BUILD", self._is_unity_build_enabled())
+        if self._is_unity_build_enabled():
+            cmake.definitions["UNITY_BUILD_BATCH_SIZE"] = self._environ_value(
+                "UNITY_BUILD_BATCH_SIZE", self.plugin_unity_build_batch_size)
+
         self.add_cmake_option(cmake, "COMPILE_WITH_LLVM_TOOLS", self._is_compile_with_llvm_tools_enabled())
 
+        cmake.definitions["FLEXTOOL_CACHE_DIR"] = self._flextool_cache_dir()
+
+        if self._linker():
+            self.output.info('added cmake definition PLUGIN_LINKER = %s' % (self._linker()))
+            cmake.definitions["PLUGIN_LINKER"] = self._linker()
+
+        self.add_cmake_option(cmake, "ENABLE_PLUGIN_EXPORT_MAP", self._is_plugin_export_map_enabled())
+
+        self.add_cmake_option(cmake, "ENABLE_SPLIT_DWARF", self._is_split_dwarf_enabled())
+
+        self.add_cmake_option(cmake, "ENABLE_COMPRESSED_DEBUG_SECTIONS", self._is_compressed_debug_sections_enabled())
+
+        if self._is_runpath_enabled():
+            from basis_plugin_helper.runtime_libs import shared_library_dirs, package_relative_dirs
+            # see https://gitlab.kitware.com/cmake/community/-/wikis/doc/cmake/RPATH-handling
+            lib_dirs = shared_library_dirs(self.deps_cpp_info.lib_paths)
+            # binaries in build folder are not relocated
+            cmake.definitions["CMAKE_BUILD_RPATH"] = ";".join(lib_dirs)
+            # installed binaries find dependencies relative to package folder
+            # ($ORIGIN is added by Findbasis_plugin_helper.cmake, definitions are
+            # passed through shell), absolute paths are used only if package folder
+            # is unknown (local build)
+            if self.package_folder:
+                cmake.definitions["PLUGIN_INSTALL_RPATH_DIRS"] = ";".join(
+                    package_relative_dirs(lib_dirs, self.package_folder))
+            else:
+                cmake.definitions["CMAKE_INSTALL_RPATH"] = ";".join(lib_dirs)
+            cmake.definitions["CMAKE_INSTALL_RPATH_USE_LINK_PATH"] = "OFF"
+
         return cmake
 
+    @timed_stage("package")
     def plugin_package(self):
-        self.copy(pattern="LICENSE", dst="licenses", src=self.plugin_source_subfolder)
+        with self._timed_stage("copy"):
+            self.copy(pattern="LICENSE", dst="licenses", src=self.plugin_source_subfolder)
 
-        self.copy_conanfile_for_editable_package(".")
+            self.copy_conanfile_for_editable_package(".")
 
         self.rmdir_if_packaged('.git')
         self.rmdir_if_packaged('tests')
         self.rmdir_if_packaged('lib/tests')
         self.rmdir_if_packaged('lib/pkgconfig')
 
-    def plugin_build(self, cmake):
+        self._save_libs_manifest()
+
+        if self._is_pgo_enabled():
+            self._package_pgo_profile()
+
+        if self._is_split_dwarf_enabled():
+            self._package_split_dwarf()
+
+        if self._is_coverage_enabled():
+            self.copy("coverage_summary.json",
+                dst=os.path.dirname(self.plugin_coverage_summary), keep_path=False)
+
+        if self._is_benchmark_enabled():
+            self.copy("benchmark_results.json",
+                dst=os.path.dirname(self.plugin_benchmark_results), keep_path=False)
+
+    # Returns names of stages that ran
+    def _run_build_stages(self, cmake):
         if self.settings.compiler == 'gcc':
             cmake.definitions["CMAKE_C_COMPILER"] = "gcc-{}".format(
                 self.settings.compiler.version)
             cmake.definitions["CMAKE_CXX_COMPILER"] = "g++-{}".format(
                 self.settings.compiler.version)
 
-        # The CMakeLists.txt file must be in `source_folder`
-        cmake.configure(source_folder=self.plugin_source_subfolder)
+        jobs = self._build_jobs(cmake)
+        self.output.info('Build jobs: %s' % (jobs))
+        cmake.definitions.update(jobs.cmake_definitions())
+        if not jobs.use_job_pools and jobs.build_jobs < jobs.compile_jobs:
+            self.output.warn('link jobs limit compile jobs, use Ninja generator to limit them separately')
 
-        cpu_count = tools.cpu_count()
-        self.output.info('Detected %s CPUs' % (cpu_count))
+        ccache = self._ccache()
+        ccache_env = {}
+        if ccache:
+            ccache_program, ccache_env = ccache
+            self.output.info('Using ccache: %s' % (", ".join(
+                "%s=%s" % item for item in sorted(ccache_env.items()))))
+            cmake.definitions["CMAKE_C_COMPILER_LAUNCHER"] = ccache_program
+            cmake.definitions["CMAKE_CXX_COMPILER_LAUNCHER"] = ccache_program
+
+        with tools.environment_append(ccache_env):
+            if self._is_pgo_enabled():
+                self._prepare_pgo(cmake, jobs)
+
+            self._configure_if_changed(cmake)
+
+            # used to add compile and link steps to timeline
+            ninja_log = os.path.join(self.build_folder, ".ninja_log")
+            ninja_log_offset = os.path.getsize(ninja_log) if os.path.isfile(ninja_log) else 0
+            compile_start = time.time()
+
+            if ccache:
+                from basis_plugin_helper.ccache import read_ccache_stats
+                ccache_stats_before = read_ccache_stats(ccache_program, ccache_env)
+
+            with self._timed_stage("compile"):
+                # -j flag for parallel builds
+                cmake.build(args=["--", "-j%s" % jobs.build_jobs])
 
-        # -j flag for parallel builds
-        cmake.build(args=["--", "-j%s" % cpu_count])
+        self._timeline().add_ninja_log(ninja_log, ninja_log_offset, compile_start)
+        self._report_link_times(ninja_log, ninja_log_offset)
+
+        if ccache:
+            self._report_ccache_stats(ccache_program, ccache_env, ccache_stats_before)
+
+        stages = ["configure", "compile"]
+        if self._is_analysis_stage_enabled():
+          self._run_analysis(jobs)
+          stages.append("analysis")
 
         if self._is_tests_enabled():
-          self.output.info('Running tests')
-          cmake.build(args=["--target", \
-            "{}_run_all_tests".format(self.name), \
-            "--", "-j%s" % cpu_count])
+          self._run_tests(cmake, jobs)
+          stages.append("tests")
+
+        if self._is_tests_enabled() and self._is_coverage_enabled():
+          self._run_coverage(jobs)
+          stages.append("coverage")
+
+        if self._is_benchmark_enabled():
+          self._run_benchmarks()
+          stages.append("benchmarks")
+        return stages
+
+    @timed_stage("build")
+    def plugin_build(self, cmake):
+        from basis_plugin_helper.stage_ledger import StageLedger
+
+        stages = self._run_build_stages(cmake)
+
+        ledger = StageLedger(self._plugin_cache_dir())
+        ledger.reset()
+        values = self._build_variant_values()
+        ledger.record(StageLedger.variant_key(values), values, stages)
+
+    # Conan does not call build() for variants with same build_id
+    # as already built variant (see `plugin_build_id`), call it at the start of package()
+    # to run stages required by current variant (build tests, run tests, etc.)
+    # in shared build folder. Unchanged targets are not rebuilt,
+    # unchanged tests that passed before are skipped.
+    # USAGE:
+    # def package(self):
+    #     cmake = self._configure_cmake()
+    #     self.plugin_run_pending_stages(cmake)
+    #     cmake.install()
+    #     self.plugin_package()
+    def plugin_run_pending_stages(self, cmake):
+        from basis_plugin_helper.stage_ledger import StageLedger
+
+        ledger = StageLedger(self._plugin_cache_dir())
+        values = self._build_variant_values()
+        variant_key = StageLedger.variant_key(values)
+        if ledger.is_done(variant_key):
+            return
+        self.output.info('Build folder is shared with other variants (build_id), '
+                         'running stages of variant %s' % (variant_key))
+        with self._timed_stage("variant_stages"):
+            stages = self._run_build_stages(cmake)
+        ledger.record(variant_key, values, stages)
 
     # Importing files copies files from the local store to your project.
+    # Files are copied by default, set IMPORT_MODE to hardlink or symlink them
+    # (see FileInstaller). Symlinks point into conan cache, so imported files
+    # change if dependency packages are rebuilt or removed.
+    # With IMPORT_MODE other than copy files that did not change since previous
+    # imports are skipped. Files are registered with conan importer in all modes.
     def plugin_imports(self):
+        from basis_plugin_helper.imports import import_files, \
+            RUNTIME_IMPORTS, STATIC_LIBRARY_IMPORTS
+
         dest = os.getenv("CONAN_IMPORT_PATH", "bin")
-        self.copy("license*", dst=dest, ignore_case=True)
-        self.copy("*.dll", dst=dest, src="bin")
-        self.copy("*.so*", dst=dest, src="bin")
-        self.copy("*.pdb", dst=dest, src="lib")
-        self.copy("*.dylib*", dst=dest, src="lib")
-        self.copy("*.lib*", dst=dest, src="lib")
-        self.copy("*.a*", dst=dest, src="lib")
+        rules = list(RUNTIME_IMPORTS)
+        if self._is_import_static_libs_enabled():
+            rules.extend(STATIC_LIBRARY_IMPORTS)
+        import_files(self, dest, rules, mode = self._environ_value("IMPORT_MODE", "copy"))
+
+    # NOTE: call `plugin_package` after `cmake.install`,
+    # manifest is not saved if lib dir has no libraries yet
+    def _save_libs_manifest(self):
+        from basis_plugin_helper.runtime_libs import shared_library_dirs, \
+            dependency_library_dirs
+
+        libs = tools.collect_libs(self, folder="lib")
+        if not libs:
+            return
+        save_json(os.path.join(self.package_folder, self.plugin_libs_manifest), {
+            "libs": libs,
+            # see `_runtime_library_dirs`
+            "shared_libs": bool(shared_library_dirs([os.path.join(self.package_folder, "lib")])),
+            "dependency_library_dirs": dependency_library_dirs(self.deps_cpp_info),
+        })
+
+    def _libs_manifest(self):
+        return load_json(os.path.join(self.package_folder, self.plugin_libs_manifest))
+
+    # Libraries from manifest saved by `plugin_package`,
+    # scans lib dir only if manifest is missing (packages created before)
+    def _packaged_libs(self):
+        manifest = self._libs_manifest()
+        if manifest is not None:
+            return manifest["libs"]
+        return tools.collect_libs(self)
+
+    # Library dirs for LD_LIBRARY_PATH, depends on RUNTIME_LIBRARY_LAYOUT:
+    #   "paths" - deduplicated dirs of package and dependencies
+    #     that contain shared libraries (default),
+    #     dirs are taken from manifest saved by `plugin_package`
+    #   "farm" - single dir with symlinks to shared libraries
+    #     (RUNTIME_LIBRARY_FARM_DIR or dir in conan user home)
+    #   "runpath" - only lib dir of package, dependencies are found
+    #     using RUNPATH (requires packages built with ENABLE_RUNPATH)
+    def _runtime_library_dirs(self):
+        from basis_plugin_helper.runtime_libs import shared_library_dirs, \
+            resolve_dependency_library_dirs, build_library_farm, default_library_farm_dir
+
+        package_lib_dir = os.path.join(self.package_folder, "lib")
+        layout = self._environ_value("RUNTIME_LIBRARY_LAYOUT", "paths")
+        if layout == "runpath":
+            return [package_lib_dir]
+
+        manifest = self._libs_manifest() or {}
+        if "shared_libs" in manifest:
+            dirs = [package_lib_dir] if manifest["shared_libs"] else []
+        else:
+            dirs = shared_library_dirs([package_lib_dir])
+        dirs.extend(path for path in resolve_dependency_library_dirs(
+            self.deps_cpp_info, manifest.get("dependency_library_dirs", {}))
+            if path not in dirs)
+        if layout == "farm":
+            farm_dir = self._environ_value("RUNTIME_LIBRARY_FARM_DIR") \
+                or default_library_farm_dir(dirs)
+            installer = build_library_farm(dirs, farm_dir)
+            self.output.info('Runtime library farm %s: %s' % (farm_dir, installer.summary()))
+            return [farm_dir]
+        if layout != "paths":
+            raise ConanInvalidConfiguration("unknown RUNTIME_LIBRARY_LAYOUT: %s" % (layout))
+        return dirs
 
     # package_info() method specifies the list of
     # the necessary libraries, defines and flags
@@ -445,11 +1525,9 @@ class CMakePackage(ConanFile, RequireScm):
     # For instance, you need to specify the lib directories, etc.
     def plugin_package_info(self):
         self.cpp_info.includedirs = ["include"]
-        self.cpp_info.libs = tools.collect_libs(self)
+        self.cpp_info.libs = self._packaged_libs()
         self.cpp_info.libdirs = ["lib"]
         self.cpp_info.bindirs = ["bin"]
-        self.env_info.LD_LIBRARY_PATH.append(
-            os.path.join(self.package_folder, "lib"))
         self.env_info.PATH.append(os.path.join(self.package_folder, "bin"))
-        for libpath in self.deps_cpp_info.lib_paths:
+        for libpath in self._runtime_library_dirs():
             self.env_info.LD_LIBRARY_PATH.append(libpath)
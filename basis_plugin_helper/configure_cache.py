@@ -0,0 +1,81 @@
+import os
+from basis_plugin_helper.fileutils import file_digest, load_json, save_json
+
+# files generated by conan that are used as CMake inputs
+CONAN_CMAKE_FILES = ("conan_paths.cmake", "conanbuildinfo.cmake")
+
+# Allows to skip `cmake.configure` if nothing changed since previous configure.
+#
+# NOTE: changes in nested CMakeLists.txt and included *.cmake files
+# are also tracked by CMake itself, build system re-runs configure step
+# if any of them changed (see CMAKE_CONFIGURE_DEPENDS).
+# But cmake definitions passed by `-D` are not tracked by CMake.
+class ConfigureCache:
+    def __init__(self, cache_dir, source_folder, build_folder):
+        self.path = os.path.join(cache_dir, "configure_fingerprint.json")
+        self.source_folder = source_folder
+        self.build_folder = build_folder
+
+    def _input_files(self):
+        files = [os.path.join(self.build_folder, name) for name in CONAN_CMAKE_FILES]
+        files.append(os.path.join(self.source_folder, "CMakeLists.txt"))
+        cmake_dir = os.path.join(self.source_folder, "cmake")
+        if os.path.isdir(cmake_dir):
+            for name in sorted(os.listdir(cmake_dir)):
+                if name.endswith(".cmake"):
+                    files.append(os.path.join(cmake_dir, name))
+        return files
+
+    def fingerprint(self, cmake):
+        return {
+            "generator": str(cmake.generator),
+            "source_folder": os.path.abspath(self.source_folder),
+            "definitions": dict((str(name), str(value))
+                                for name, value in cmake.definitions.items()),
+            "files": dict((os.path.relpath(path, self.build_folder), file_digest(path))
+                          for path in self._input_files()),
+        }
+
+    # Returns list of reasons to re-run configure,
+    # empty list means that configure can be skipped.
+    # compatible: {definition name: function(old value, new value)}
+    # that returns True if configured value can be kept
+    # (for example, job pools that fit into currently available memory)
+    def changes(self, fingerprint, compatible = None):
+        compatible = compatible or {}
+        if not os.path.isfile(os.path.join(self.build_folder, "CMakeCache.txt")):
+            return ["CMakeCache.txt not found"]
+        previous = load_json(self.path)
+        if previous is None:
+            return ["no previous configure fingerprint"]
+
+        reasons = []
+        for key in ("generator", "source_folder"):
+            if previous.get(key) != fingerprint[key]:
+                reasons.append("{} changed: {} -> {}".format(
+                    key, previous.get(key), fingerprint[key]))
+        for group, what in (("definitions", "definition"), ("files", "file")):
+            old_values = previous.get(group, {})
+            new_values = fingerprint[group]
+            for name in sorted(set(old_values) | set(new_values)):
+                if name not in new_values:
+                    reasons.append("{} removed: {}".format(what, name))
+                elif name not in old_values:
+                    reasons.append("{} added: {}".format(what, name))
+                elif old_values[name] != new_values[name]:
+                    if group == "definitions" and name in compatible \
+                       and compatible[name](old_values[name], new_values[name]):
+                        continue
+                    if group == "definitions":
+                        reasons.append("{} changed: {} = {} -> {}".format(
+                            what, name, old_values[name], new_values[name]))
+                    else:
+                        reasons.append("{} changed: {}".format(what, name))
+        return reasons
+
+    def save(self, fingerprint):
+        save_json(self.path, fingerprint)
+
+    def invalidate(self):
+        if os.path.isfile(self.path):
+            os.remove(self.path)
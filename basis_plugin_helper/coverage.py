@@ -0,0 +1,264 @@
+import fnmatch, os, re, subprocess, time
+from concurrent.futures import ThreadPoolExecutor
+from basis_plugin_helper.fileutils import file_digest, string_digest, load_json, save_json
+
+# bump to invalidate all cached results
+CACHE_VERSION = "1"
+
+GCDA_EXTENSION = ".gcda"
+PROFRAW_EXTENSION = ".profraw"
+
+# test executable of raw profiles in group dir, see `raw_profile_pattern`
+GROUP_BINARY_FILE = "binary.txt"
+
+# Returns safe file name (test names contain "/", ".", etc.)
+def _safe_name(name):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+# Returns LLVM_PROFILE_FILE for test, raw profiles of tests
+# that run same executable are stored in one group dir.
+# see https://clang.llvm.org/docs/SourceBasedCodeCoverage.html#running-the-instrumented-program
+def raw_profile_pattern(raw_dir, test):
+    executable = test.command[0]
+    group_dir = os.path.join(raw_dir, "{}-{}".format(
+        _safe_name(os.path.basename(executable)), string_digest(executable)[:8]))
+    if not os.path.isdir(group_dir):
+        os.makedirs(group_dir, exist_ok=True)
+    binary_file = os.path.join(group_dir, GROUP_BINARY_FILE)
+    if not os.path.isfile(binary_file):
+        with open(binary_file, "w") as f:
+            f.write(executable)
+    return os.path.join(group_dir, "{}-%p{}".format(_safe_name(test.name), PROFRAW_EXTENSION))
+
+# Removes raw profiles of previous run of test,
+# raw profiles of tests that were not run again (cached) are kept
+def remove_raw_profiles(raw_dir, test):
+    pattern = raw_profile_pattern(raw_dir, test)
+    prefix = os.path.basename(pattern).split("%p")[0]
+    group_dir = os.path.dirname(pattern)
+    for name in os.listdir(group_dir):
+        if name.startswith(prefix) and name.endswith(PROFRAW_EXTENSION):
+            os.remove(os.path.join(group_dir, name))
+
+def has_raw_profiles(raw_dir):
+    for _, _, files in os.walk(raw_dir):
+        if any(name.endswith(PROFRAW_EXTENSION) for name in files):
+            return True
+    return False
+
+# Parses output of `gcov --stdout` (also `llvm-cov gcov -t`).
+# Returns {source file: {line: execution count}} of executable lines.
+# see https://gcc.gnu.org/onlinedocs/gcc/Invoking-Gcov.html
+def parse_gcov(text, working_dir):
+    line_counts = {}
+    lines = None
+    for line in text.splitlines():
+        count, _, rest = line.partition(":")
+        number, _, source = rest.partition(":")
+        count = count.strip()
+        number = number.strip()
+        if count == "-":
+            if number == "0":
+                if source.startswith("Working directory:"):
+                    working_dir = source[len("Working directory:"):]
+                elif source.startswith("Source:"):
+                    path = os.path.normpath(os.path.join(working_dir, source[len("Source:"):]))
+                    lines = line_counts.setdefault(path, {})
+            continue
+        if lines is None or not number.isdigit():
+            continue
+        # "#####" and "=====" are lines that were not executed,
+        # "1*" is line with blocks that were not executed
+        count = count.rstrip("*")
+        lines[int(number)] = lines.get(int(number), 0) + (int(count) if count.isdigit() else 0)
+    return line_counts
+
+# Returns {source file: {line: execution count}} from lcov tracefile
+# see https://manpages.debian.org/lcov/geninfo.1.en.html#FILES
+def parse_lcov(text):
+    line_counts = {}
+    lines = None
+    for line in text.splitlines():
+        if line.startswith("SF:"):
+            lines = line_counts.setdefault(os.path.normpath(line[len("SF:"):]), {})
+        elif line.startswith("DA:") and lines is not None:
+            number, count = line[len("DA:"):].split(",")[:2]
+            lines[int(number)] = lines.get(int(number), 0) + int(count)
+    return line_counts
+
+def merge_line_counts(target, source):
+    for path, lines in source.items():
+        target_lines = target.setdefault(path, {})
+        for number, count in lines.items():
+            target_lines[int(number)] = target_lines.get(int(number), 0) + count
+    return target
+
+def write_lcov(line_counts, path):
+    with open(path, "w") as f:
+        for source in sorted(line_counts):
+            lines = line_counts[source]
+            f.write("SF:{}\n".format(source))
+            for number in sorted(lines):
+                f.write("DA:{},{}\n".format(number, lines[number]))
+            f.write("LH:{}\nLF:{}\nend_of_record\n".format(
+                len([count for count in lines.values() if count > 0]), len(lines)))
+
+def _percent(covered, total):
+    return round(100.0 * covered / total, 2) if total else 0.0
+
+# Compact summary: covered and total lines per file and in total
+def coverage_summary(line_counts):
+    files = {}
+    for source, lines in sorted(line_counts.items()):
+        covered = len([count for count in lines.values() if count > 0])
+        files[source] = {"covered": covered, "lines": len(lines),
+                         "percent": _percent(covered, len(lines))}
+    covered = sum(entry["covered"] for entry in files.values())
+    total = sum(entry["lines"] for entry in files.values())
+    return {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "covered": covered,
+        "lines": total,
+        "percent": _percent(covered, total),
+        "files": files,
+    }
+
+# Keeps coverage of files in `source_dir` that match none of `exclude` patterns,
+# patterns are matched against paths relative to `source_dir`
+# (dirs above source folder must not exclude files)
+def filter_line_counts(line_counts, source_dir, exclude):
+    source_dir = os.path.normpath(source_dir)
+    selected = {}
+    for path, lines in line_counts.items():
+        if not path.startswith(source_dir + os.sep):
+            continue
+        relative_path = os.path.relpath(path, source_dir).replace(os.sep, "/")
+        if any(fnmatch.fnmatch(relative_path, pattern) for pattern in exclude):
+            continue
+        selected[relative_path] = lines
+    return selected
+
+# Collects coverage of GCC (.gcda, per object file)
+# or Clang source-based coverage (.profraw, per test executable) in parallel.
+# Line counts of object file or test executable are cached,
+# cache key is digest of its counters (and binaries), so only objects
+# with changed counters are processed by gcov or llvm-cov again.
+class CoverageCollector:
+    def __init__(self, output, build_folder, cache_dir, jobs):
+        self.output = output
+        self.build_folder = build_folder
+        self.cache_dir = cache_dir
+        self.jobs = max(1, jobs)
+        self.used_keys = set()
+
+    def _result_path(self, key, extension = ".json"):
+        return os.path.join(self.cache_dir, key[:2], key + extension)
+
+    # Returns (line counts, True if cached).
+    # `compute` returns None if tool failed, such result is not cached
+    # (transient failure must not hide coverage of object with same counters).
+    def _cached(self, key, compute):
+        self.used_keys.add(key)
+        path = self._result_path(key)
+        line_counts = load_json(path)
+        if line_counts is not None:
+            return line_counts, True
+        line_counts = compute()
+        if line_counts is None:
+            return {}, False
+        save_json(path, line_counts)
+        return line_counts, False
+
+    # Returns stdout or None if command failed
+    def _run(self, command, cwd):
+        try:
+            process = subprocess.run(command, cwd=cwd,
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as error:
+            self.output.warn("{} failed: {}".format(" ".join(command[:2]), error))
+            return None
+        if process.returncode != 0:
+            self.output.warn("{} failed: {}".format(" ".join(command[:2]),
+                process.stderr.decode("utf-8", "replace").strip()))
+            return None
+        return process.stdout.decode("utf-8", "replace")
+
+    def _gcov_object(self, gcov_command, gcda):
+        gcno = gcda[:-len(GCDA_EXTENSION)] + ".gcno"
+        key = string_digest("\n".join([CACHE_VERSION, "gcov", " ".join(gcov_command),
+                                       str(file_digest(gcda)), str(file_digest(gcno))]))
+        object_dir = os.path.dirname(gcda)
+
+        def gcov():
+            output = self._run(gcov_command + ["--stdout", "--object-directory", object_dir, gcda],
+                               cwd=object_dir)
+            return parse_gcov(output, object_dir) if output is not None else None
+        return self._cached(key, gcov)
+
+    # gcov_command: ["gcov"] or ["llvm-cov", "gcov"]
+    def collect_gcov(self, gcov_command):
+        gcda_files = []
+        for root, _, files in os.walk(self.build_folder):
+            gcda_files.extend(os.path.join(root, name) for name in files
+                              if name.endswith(GCDA_EXTENSION))
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            results = list(executor.map(
+                lambda gcda: self._gcov_object(gcov_command, gcda), sorted(gcda_files)))
+        return self._merge(results, "object files")
+
+    def _llvm_group(self, llvm_profdata, llvm_cov, group_dir, objects):
+        binary = open(os.path.join(group_dir, GROUP_BINARY_FILE)).read().strip()
+        raw_profiles = sorted(os.path.join(group_dir, name) for name in os.listdir(group_dir)
+                              if name.endswith(PROFRAW_EXTENSION))
+        if not raw_profiles or not os.path.isfile(binary):
+            return {}, True
+        objects = [path for path in objects if path != binary]
+        key = string_digest("\n".join([CACHE_VERSION, "llvm", llvm_profdata, llvm_cov]
+            + [str(file_digest(path)) for path in [binary] + objects + raw_profiles]))
+
+        def export():
+            profdata = self._result_path(key, ".profdata")
+            os.makedirs(os.path.dirname(profdata), exist_ok=True)
+            # profiles of group are merged by single thread,
+            # groups are merged in parallel
+            merged = self._run([llvm_profdata, "merge", "-sparse", "-num-threads=1",
+                                "-o", profdata] + raw_profiles, cwd=group_dir)
+            if merged is None or not os.path.isfile(profdata):
+                return None
+            try:
+                output = self._run(
+                    [llvm_cov, "export", "-format=lcov", "-instr-profile=" + profdata, binary]
+                    + ["-object=" + path for path in objects], cwd=group_dir)
+                return parse_lcov(output) if output is not None else None
+            finally:
+                os.remove(profdata)
+        return self._cached(key, export)
+
+    # raw_dir: dir with raw profiles of tests, see `raw_profile_pattern`
+    # objects: shared libraries (plugins) loaded by tests
+    def collect_llvm(self, llvm_profdata, llvm_cov, raw_dir, objects = ()):
+        group_dirs = [os.path.join(raw_dir, name) for name in sorted(os.listdir(raw_dir))] \
+            if os.path.isdir(raw_dir) else []
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            results = list(executor.map(
+                lambda group_dir: self._llvm_group(llvm_profdata, llvm_cov, group_dir, objects),
+                group_dirs))
+        return self._merge(results, "test executables")
+
+    def _merge(self, results, what):
+        line_counts = {}
+        for counts, _ in results:
+            merge_line_counts(line_counts, counts)
+        self.output.info("Coverage of {} {}: {} processed, {} unchanged".format(
+            len(results), what, len([1 for _, cached in results if not cached]),
+            len([1 for _, cached in results if cached])))
+        return line_counts
+
+    # removes cached results that were not used by this run
+    def prune(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if os.path.splitext(name)[0] not in self.used_keys:
+                    os.remove(os.path.join(root, name))
@@ -0,0 +1,134 @@
+import hashlib, json, os, shutil
+
+# Returns hex digest of file content or None if file not exists
+def file_digest(path, algorithm = "sha256"):
+    if not os.path.isfile(path):
+        return None
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def string_digest(value, algorithm = "sha256"):
+    return hashlib.new(algorithm, value.encode("utf-8")).hexdigest()
+
+# executables and shared libraries on Linux
+def is_elf_file(path):
+    if os.path.islink(path) or not os.path.isfile(path):
+        return False
+    with open(path, "rb") as f:
+        return f.read(4) == b"\x7fELF"
+
+def load_json(path, default = None):
+    if not os.path.isfile(path):
+        return default
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except ValueError:
+        # corrupted file is same as missing file
+        return default
+
+# Writes to temporary file first,
+# so interrupted build never leaves partially written file
+def save_json(path, data):
+    dir_path = os.path.dirname(path)
+    if dir_path and not os.path.isdir(dir_path):
+        os.makedirs(dir_path)
+    tmp_path = "{}.tmp{}".format(path, os.getpid())
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+# see linux/fs.h
+FICLONE = 0x40049409
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+    shutil.copystat(src, dst)
+
+def _is_up_to_date(src, dst):
+    if not os.path.isfile(dst) or os.path.islink(dst):
+        return False
+    if os.path.samefile(src, dst):
+        return True
+    src_stat = os.stat(src)
+    dst_stat = os.stat(dst)
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+    if int(src_stat.st_mtime) == int(dst_stat.st_mtime):
+        return True
+    return file_digest(src) == file_digest(dst)
+
+# Copies or links files, skips files that are already up to date.
+# mode:
+#   "copy" - copy file content
+#   "hardlink" - hardlink, fallback to copy (different filesystem, etc.)
+#   "reflink" - copy-on-write clone (btrfs, xfs, etc.), fallback to copy
+#   "symlink" - symbolic link to source file, fallback to copy
+#   "auto" - reflink, then hardlink, then copy
+class FileInstaller:
+    def __init__(self, mode = "copy"):
+        if mode not in ("copy", "hardlink", "reflink", "symlink", "auto"):
+            raise ValueError("unknown file install mode: {}".format(mode))
+        if mode == "auto":
+            self.methods = ["reflinked", "hardlinked", "copied"]
+        else:
+            self.methods = [{
+                "copy": "copied",
+                "hardlink": "hardlinked",
+                "reflink": "reflinked",
+                "symlink": "symlinked",
+            }[mode]]
+            if mode != "copy":
+                self.methods.append("copied")
+        self.counts = {}
+
+    def _count(self, method):
+        self.counts[method] = self.counts.get(method, 0) + 1
+        return method
+
+    # file is up to date, checked by caller
+    def skip(self):
+        return self._count("skipped")
+
+    def _install_with(self, method, src, dst):
+        if method == "copied":
+            shutil.copy2(src, dst)
+        elif method == "hardlinked":
+            os.link(src, dst)
+        elif method == "reflinked":
+            _reflink(src, dst)
+        elif method == "symlinked":
+            os.symlink(os.path.abspath(src), dst)
+
+    # Returns what was done: "skipped", "copied", "hardlinked", etc.
+    def install(self, src, dst):
+        if os.path.islink(dst) and os.path.realpath(dst) == os.path.realpath(src):
+            return self._count("skipped")
+        if _is_up_to_date(src, dst):
+            return self._count("skipped")
+
+        dst_dir = os.path.dirname(dst)
+        if dst_dir and not os.path.isdir(dst_dir):
+            os.makedirs(dst_dir)
+        for method in list(self.methods):
+            if os.path.lexists(dst):
+                os.remove(dst)
+            try:
+                self._install_with(method, src, dst)
+                return self._count(method)
+            except OSError:
+                if method == "copied":
+                    raise
+                # not supported by filesystem, do not try again
+                self.methods.remove(method)
+
+    def summary(self):
+        if not self.counts:
+            return "no files"
+        return ", ".join("{} {}".format(count, method)
+                         for method, count in sorted(self.counts.items()))
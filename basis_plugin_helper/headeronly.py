@@ -1,12 +1,34 @@
 from conans import ConanFile
 from basis_plugin_helper.require_scm import RequireScm
+from basis_plugin_helper.fileutils import FileInstaller
 import os
 
+HEADER_EXTENSIONS = ('.h', '.hpp', '.hxx', '.hcc')
+
+# Walks include dir once and copies (or links) headers
+# that changed since previous package.
+#
+# Recipe can override `header_extensions` (tuple of extensions)
+# and `header_install_mode` (see FileInstaller),
+# PACKAGE_HEADERS_MODE environ variable overrides `header_install_mode`.
+# By default headers are linked only inside conan cache,
+# so local edits of headers never modify package.
 def package_headers(conanfile):
         include_dir = conanfile._repository_include_dir_required
+        extensions = tuple(getattr(conanfile, 'header_extensions', HEADER_EXTENSIONS))
+        default_mode = 'auto' if conanfile.in_local_cache else 'copy'
+        mode = os.getenv('PACKAGE_HEADERS_MODE',
+                         getattr(conanfile, 'header_install_mode', default_mode))
+
+        installer = FileInstaller(mode)
+        dst_dir = os.path.join(conanfile.package_folder, 'include')
+        for root, _, files in os.walk(include_dir):
+            for name in files:
+                if name.endswith(extensions):
+                    src = os.path.join(root, name)
+                    installer.install(src, os.path.join(dst_dir, os.path.relpath(src, include_dir)))
 
-        for ext in ['*.h', '*.hpp', '*.hxx', '*.hcc']:
-            conanfile.copy(ext, dst='include', src=include_dir)
+        conanfile.output.info('Packaged headers: %s' % (installer.summary()))
 
 class HeaderOnlyPackage(ConanFile, RequireScm):
     def package(self):
@@ -0,0 +1,95 @@
+import fnmatch, os
+from basis_plugin_helper.fileutils import FileInstaller, load_json, save_json
+
+# (pattern, src folder of dependency, ignore case)
+# same as `self.copy(pattern, dst=dest, src=src)` in imports()
+RUNTIME_IMPORTS = (
+    ("license*", "", True),
+    ("*.dll", "bin", False),
+    ("*.so*", "bin", False),
+    ("*.pdb", "lib", False),
+    ("*.dylib*", "lib", False),
+    ("*.lib*", "lib", False),
+)
+
+# static libraries are not used by runtime consumers
+STATIC_LIBRARY_IMPORTS = (
+    ("*.a*", "lib", False),
+)
+
+IMPORTS_MANIFEST = ".basis_plugin_helper_imports.json"
+
+def _matches(path, pattern, ignore_case):
+    if ignore_case:
+        return fnmatch.fnmatch(path.lower(), pattern.lower())
+    return fnmatch.fnmatchcase(path, pattern)
+
+# Returns dict {relative dst path: src path}
+def _collect_imports(conanfile, rules):
+    imports = {}
+    for dep_name in conanfile.deps_cpp_info.deps:
+        rootpath = conanfile.deps_cpp_info[dep_name].rootpath
+        for pattern, src, ignore_case in rules:
+            src_dir = os.path.join(rootpath, src)
+            for root, _, files in os.walk(src_dir):
+                for name in files:
+                    src_path = os.path.join(root, name)
+                    relpath = os.path.relpath(src_path, src_dir).replace(os.sep, "/")
+                    if _matches(relpath, pattern, ignore_case):
+                        imports[relpath] = src_path
+    return imports
+
+def _source_state(src_path):
+    stat = os.stat(src_path)
+    return [src_path, stat.st_size, stat.st_mtime]
+
+# Registers files with conan importer (`self.copy` in imports()),
+# so they are listed in conan_imports_manifest.txt, removed by conan after build()
+# and by `conan imports --undo`
+def _register_imported_files(conanfile, paths):
+    copied_files = getattr(conanfile.copy, "copied_files", None)
+    if copied_files is not None:
+        copied_files.update(paths)
+
+# Imports files of dependencies into `dest` (relative to imports folder).
+# "copy" mode uses `self.copy` of conan importer.
+# Other modes (hardlinks, symlinks, see FileInstaller) are optimization on top of it:
+# manifest in `dest` allows to skip files that did not change since previous imports
+# and to remove files that are no longer imported, installed files are registered
+# with conan importer same as copied files.
+def import_files(conanfile, dest, rules, mode = "copy"):
+    if mode == "copy":
+        for pattern, src, ignore_case in rules:
+            conanfile.copy(pattern, dst=dest, src=src, ignore_case=ignore_case)
+        return
+
+    dest = os.path.join(getattr(conanfile, "imports_folder", None) or os.getcwd(), dest)
+    manifest_path = os.path.join(dest, IMPORTS_MANIFEST)
+    manifest = load_json(manifest_path, {})
+    if manifest.get("mode") != mode:
+        manifest = {}
+    previous_files = manifest.get("files", {})
+
+    installer = FileInstaller(mode)
+    files = {}
+    for relpath, src_path in sorted(_collect_imports(conanfile, rules).items()):
+        dst_path = os.path.join(dest, relpath)
+        state = _source_state(src_path)
+        files[relpath] = state
+        if previous_files.get(relpath) == state and os.path.lexists(dst_path):
+            installer.skip()
+            continue
+        installer.install(src_path, dst_path)
+
+    removed = 0
+    for relpath in previous_files:
+        dst_path = os.path.join(dest, relpath)
+        if relpath not in files and os.path.lexists(dst_path):
+            os.remove(dst_path)
+            removed += 1
+
+    save_json(manifest_path, {"mode": mode, "files": files})
+    _register_imported_files(conanfile,
+        [os.path.join(dest, relpath) for relpath in files] + [manifest_path])
+    conanfile.output.info("Imported into {}: {}, {} removed".format(
+        dest, installer.summary(), removed))
@@ -0,0 +1,183 @@
+import os
+
+# approximate peak memory usage (in MB) of single compile or link job
+# of chromium_base-sized plugin, depends on build mode
+COMPILE_JOB_MEMORY_MB = {
+    "default": 1024,
+    "lto": 1536,
+    "sanitizer": 2048,
+    "coverage": 1536,
+}
+
+LINK_JOB_MEMORY_MB = {
+    "default": 2048,
+    "lto": 8192,
+    "sanitizer": 4096,
+    "coverage": 3072,
+}
+
+def _read_first_line(path):
+    try:
+        with open(path) as f:
+            return f.readline().strip()
+    except (IOError, OSError):
+        return None
+
+def _read_int(path):
+    value = _read_first_line(path)
+    if value is None or not value.isdigit():
+        return None
+    return int(value)
+
+def _environ_int(name):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return None
+    return int(value)
+
+# CPU limit set by cgroup (docker --cpus, k8s limits)
+# or None if there is no limit.
+def cgroup_cpu_limit():
+    # cgroup v2: "max 100000" or "200000 100000"
+    cpu_max = _read_first_line("/sys/fs/cgroup/cpu.max")
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and quota.isdigit() and period.isdigit():
+            return max(1, int(quota) // int(period))
+        return None
+    # cgroup v1
+    quota = _read_first_line("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+    period = _read_int("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota and quota.isdigit() and period:
+        return max(1, int(quota) // period)
+    return None
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, limit)
+    return max(1, cpus)
+
+# Memory limit set by cgroup minus memory already used by cgroup
+# or None if there is no limit.
+def cgroup_available_memory_mb():
+    # cgroup v2
+    limit = _read_first_line("/sys/fs/cgroup/memory.max")
+    if limit is not None:
+        if not limit.isdigit():
+            return None
+        usage = _read_int("/sys/fs/cgroup/memory.current") or 0
+        return (int(limit) - usage) // (1024 * 1024)
+    # cgroup v1, "no limit" is reported as huge number
+    limit = _read_int("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+    if limit is None or limit >= (1 << 60):
+        return None
+    usage = _read_int("/sys/fs/cgroup/memory/memory.usage_in_bytes") or 0
+    return (limit - usage) // (1024 * 1024)
+
+def system_available_memory_mb():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    # value in kB
+                    return int(line.split()[1]) // 1024
+    except (IOError, OSError):
+        pass
+    return None
+
+# Returns None if available memory can not be detected
+def available_memory_mb():
+    budget = _environ_int("BUILD_MEMORY_BUDGET_MB")
+    if budget is not None:
+        return budget
+    values = [value for value in (system_available_memory_mb(),
+                                  cgroup_available_memory_mb())
+              if value is not None]
+    if not values:
+        return None
+    return max(0, min(values))
+
+# Returns {pool name: size} from CMAKE_JOB_POOLS value "compile=8;link=2"
+def parse_job_pools(value):
+    pools = {}
+    for item in value.split(";"):
+        name, _, size = item.partition("=")
+        if size.isdigit():
+            pools[name] = int(size)
+    return pools
+
+# True if job pools of previous configure are not larger than current limits,
+# smaller pools are kept to avoid reconfigure on every change of available memory,
+# larger pools require reconfigure (they may not fit into memory of current machine)
+def job_pools_fit(configured, current):
+    configured = parse_job_pools(configured)
+    current = parse_job_pools(current)
+    return set(configured) == set(current) and \
+        all(configured[name] <= current[name] for name in current)
+
+class BuildJobs:
+    # build_mode: one of keys in COMPILE_JOB_MEMORY_MB
+    # cpu_count: upper limit for number of jobs
+    # (from `tools.cpu_count()` that respects CONAN_CPU_COUNT)
+    def __init__(self, build_mode, cpu_count, use_job_pools):
+        self.build_mode = build_mode
+        self.use_job_pools = use_job_pools
+        self.cpus = min(cpu_count, available_cpus())
+        self.memory_mb = available_memory_mb()
+
+        self.compile_job_memory_mb = _environ_int("BUILD_COMPILE_JOB_MEMORY_MB") \
+            or COMPILE_JOB_MEMORY_MB[build_mode]
+        self.link_job_memory_mb = _environ_int("BUILD_LINK_JOB_MEMORY_MB") \
+            or LINK_JOB_MEMORY_MB[build_mode]
+
+        # compile and link jobs run at same time, so memory of link pool
+        # (at most half of memory) is reserved first
+        # and compile jobs are sized against the remainder
+        link_jobs = self._jobs_for(self.memory_mb // 2 if self.memory_mb is not None else None,
+                                   self.link_job_memory_mb)
+        self.compile_jobs = self._jobs_for(
+            self.memory_mb - link_jobs * self.link_job_memory_mb if self.memory_mb is not None else None,
+            self.compile_job_memory_mb)
+        self.link_jobs = min(self.compile_jobs, link_jobs)
+
+    def _jobs_for(self, memory_mb, job_memory_mb):
+        if memory_mb is None:
+            return self.cpus
+        return max(1, min(self.cpus, memory_mb // job_memory_mb))
+
+    # value for -j flag
+    @property
+    def build_jobs(self):
+        if self.use_job_pools:
+            # link jobs are limited by job pool
+            return self.compile_jobs
+        # without job pools (Makefiles) compile and link jobs
+        # can not be limited separately
+        if self.build_mode == "default":
+            return self.compile_jobs
+        return self.link_jobs
+
+    # see https://cmake.org/cmake/help/latest/prop_gbl/JOB_POOLS.html
+    def cmake_definitions(self):
+        if not self.use_job_pools:
+            return {}
+        return {
+            "CMAKE_JOB_POOLS": "compile={};link={}".format(self.compile_jobs, self.link_jobs),
+            "CMAKE_JOB_POOL_COMPILE": "compile",
+            "CMAKE_JOB_POOL_LINK": "link",
+        }
+
+    def __str__(self):
+        memory = "unknown" if self.memory_mb is None else "{} MB".format(self.memory_mb)
+        return ("build mode: {}, CPUs: {}, available memory: {}, "
+                "compile jobs: {} (~{} MB each), link jobs: {} (~{} MB each), "
+                "job pools: {}, -j{}").format(
+                    self.build_mode, self.cpus, memory,
+                    self.compile_jobs, self.compile_job_memory_mb,
+                    self.link_jobs, self.link_job_memory_mb,
+                    "ON" if self.use_job_pools else "OFF", self.build_jobs)
@@ -0,0 +1,46 @@
+import os
+from basis_plugin_helper.fileutils import load_json, save_json
+from basis_plugin_helper.timeline import read_ninja_log, ninja_step_category
+
+LINK_TIMES_FILE = "link_times.json"
+
+# Returns dict {output: duration in ms} of link steps
+# from `.ninja_log` entries written after `offset`
+def ninja_link_steps(path, offset = 0):
+    return dict((output, end - start)
+                for start, end, output in read_ninja_log(path, offset)
+                if ninja_step_category(output) == "link")
+
+# Durations of link steps per link configuration (linker, split DWARF, etc.),
+# stored between builds to compare configurations.
+# Incremental builds re-link only some targets,
+# so latest duration of each target is kept.
+class LinkTimes:
+    def __init__(self, cache_dir):
+        self.path = os.path.join(cache_dir, LINK_TIMES_FILE)
+        self.history = load_json(self.path, {})
+
+    def record(self, config, steps):
+        self.history.setdefault(config, {}).update(steps)
+        save_json(self.path, self.history)
+
+    # Returns lines with slowest link steps of `steps` and
+    # total link time of same targets in other recorded configurations
+    def report(self, config, steps, limit = 10):
+        if not steps:
+            return ["No link steps"]
+        lines = ["{} link steps with {}, {:.2f} sec total".format(
+            len(steps), config, sum(steps.values()) / 1000.0)]
+        for output, duration in sorted(steps.items(), key=lambda item: -item[1])[:limit]:
+            lines.append("  {:8.2f} sec {}".format(duration / 1000.0, output))
+        for other_config, other_steps in sorted(self.history.items()):
+            if other_config == config:
+                continue
+            common = [output for output in steps if output in other_steps]
+            if not common:
+                continue
+            lines.append("  {} common targets: {:.2f} sec with {}, {:.2f} sec with {}".format(
+                len(common),
+                sum(steps[output] for output in common) / 1000.0, config,
+                sum(other_steps[output] for output in common) / 1000.0, other_config))
+        return lines
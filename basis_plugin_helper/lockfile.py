@@ -0,0 +1,200 @@
+import argparse, os, re, subprocess, sys, time
+from basis_plugin_helper.fileutils import file_digest, string_digest, load_json, save_json
+
+# Resolves dependency graph of recipe once (floating refs like `master@conan/stable`
+# and version ranges) and stores it in lockfile,
+# later installs use lockfile and do not resolve graph again.
+# Lockfile is created again if recipe, graph arguments (profile, settings, options)
+# or environ toggles that change requirements (ENABLE_TESTS, ENABLE_LLVM_TOOLS, etc.) change.
+#
+# USAGE:
+# python -m basis_plugin_helper.lockfile install . -pr clang -s build_type=Debug --build=missing
+# python -m basis_plugin_helper.lockfile refresh . -pr clang -s build_type=Debug
+#
+# `refresh` resolves graph again checking remotes for newer revisions (`--update`).
+# Value of `--build` (`-b missing`, `--build missing`, `--build=missing`) goes to `conan install` only.
+# Profiles are hashed by contents (including `include(...)` profiles), not by name.
+
+DEFAULT_LOCKFILE = "conan.lock"
+
+# arguments of `conan install` that do not change graph,
+# not passed to `conan lock create` (name -> has separate value)
+INSTALL_ONLY_ARGS = {
+    "-if": True,
+    "--install-folder": True,
+    "-g": True,
+    "--generator": True,
+    "--no-imports": False,
+    "-u": False,
+    "--update": False,
+}
+
+def _split_args(conan_args):
+    graph_args = []
+    install_args = []
+    args = list(conan_args)
+    while args:
+        arg = args.pop(0)
+        name = arg.split("=", 1)[0]
+        if name in ("-b", "--build"):
+            # `-b X` and `--build X` -> `--build=X`, plain `--build` builds everything
+            if "=" in arg:
+                install_args.append("--build=" + arg.split("=", 1)[1])
+            elif args and not args[0].startswith("-"):
+                install_args.append("--build=" + args.pop(0))
+            else:
+                install_args.append("--build")
+        elif name in INSTALL_ONLY_ARGS:
+            install_args.append(arg)
+            if INSTALL_ONLY_ARGS[name] and "=" not in arg and args:
+                install_args.append(args.pop(0))
+        else:
+            graph_args.append(arg)
+    return graph_args, install_args
+
+def _recipe_path(path):
+    if os.path.isdir(path):
+        return os.path.join(path, "conanfile.py")
+    return path
+
+# environ toggles read by CMakePackage, some of them add requirements
+def _environ_toggles():
+    from basis_plugin_helper.cmake import CMakePackage
+    names = sorted(list(CMakePackage.plugin_binary_environ_options)
+                   + list(CMakePackage.plugin_build_environ_options))
+    return dict((name, os.getenv(name, os.getenv(name.lower())))
+                for name in names)
+
+PROFILE_ARGS = ("-pr", "--profile", "-pr:h", "--profile:host", "-pr:b", "--profile:build")
+
+def _profiles_dir():
+    home = os.getenv("CONAN_USER_HOME", os.path.expanduser("~"))
+    return os.path.join(home, ".conan", "profiles")
+
+# same lookup as conan: path (absolute or relative to cwd or including profile),
+# otherwise name in profiles dir
+def _profile_path(name, cwd = None):
+    name = os.path.expanduser(name)
+    for base in (cwd or os.getcwd(), _profiles_dir()):
+        path = os.path.join(base, name)
+        if os.path.isfile(path):
+            return os.path.abspath(path)
+    return None
+
+# contents of profile and profiles it includes, unresolved names as is
+def _profile_digest(name, cwd = None, seen = None):
+    seen = seen if seen is not None else set()
+    path = _profile_path(name, cwd)
+    if path is None:
+        return "missing:" + name
+    if path in seen:
+        return ""
+    seen.add(path)
+    with open(path, "r") as f:
+        text = f.read()
+    parts = [file_digest(path)]
+    for include in re.findall(r"^\s*include\((.+)\)\s*$", text, re.MULTILINE):
+        parts.append(_profile_digest(include.strip(), os.path.dirname(path), seen))
+    return string_digest("\n".join(parts))
+
+# profile arguments replaced by digests of profile files,
+# default profile is used if host profile is not given
+def _graph_args_key(graph_args):
+    result = []
+    has_host_profile = False
+    args = list(graph_args)
+    while args:
+        arg = args.pop(0)
+        name = arg.split("=", 1)[0]
+        if name not in PROFILE_ARGS:
+            result.append(arg)
+            continue
+        if "=" in arg:
+            value = arg.split("=", 1)[1]
+        elif args:
+            value = args.pop(0)
+        else:
+            value = ""
+        has_host_profile = has_host_profile or name not in ("-pr:b", "--profile:build")
+        result.append("{}={}".format(name, _profile_digest(value)))
+    if not has_host_profile:
+        result.append("default={}".format(_profile_digest("default")))
+    return " ".join(result)
+
+def graph_key(path, graph_args):
+    recipe = _recipe_path(path)
+    return string_digest("\n".join([
+        file_digest(recipe) if os.path.isfile(recipe) else recipe,
+        _graph_args_key(graph_args),
+        repr(sorted(_environ_toggles().items())),
+    ]))
+
+def _run(command):
+    print(" ".join(command))
+    start = time.time()
+    subprocess.check_call(command)
+    return time.time() - start
+
+class Lockfile:
+    def __init__(self, path, conan_program = "conan"):
+        self.path = path
+        self.conan_program = conan_program
+        # stored near lockfile, conan does not allow unknown keys in lockfile
+        self.meta_path = path + ".meta.json"
+
+    def is_valid(self, key):
+        meta = load_json(self.meta_path, {})
+        return os.path.isfile(self.path) and meta.get("key") == key
+
+    def create(self, path, graph_args, key, update = False):
+        command = [self.conan_program, "lock", "create", _recipe_path(path),
+                   "--lockfile-out={}".format(self.path)] + graph_args
+        if update:
+            command.append("--update")
+        duration = _run(command)
+        save_json(self.meta_path, {
+            "key": key,
+            "graph_args": graph_args,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "resolve_sec": round(duration, 3),
+        })
+        print("Resolved dependency graph in {:.2f} sec, saved to {}".format(duration, self.path))
+        return duration
+
+    # NOTE: profile, settings and options are stored in lockfile,
+    # conan does not allow to pass them together with --lockfile
+    def install(self, path, install_args):
+        duration = _run([self.conan_program, "install", path,
+                         "--lockfile={}".format(self.path)] + install_args)
+        print("Installed using {} in {:.2f} sec".format(self.path, duration))
+        return duration
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m basis_plugin_helper.lockfile")
+    parser.add_argument("command", choices=("install", "refresh"))
+    parser.add_argument("path", help="recipe folder or conanfile.py")
+    parser.add_argument("--lockfile", default=None,
+                        help="default: {} near recipe".format(DEFAULT_LOCKFILE))
+    args, conan_args = parser.parse_known_args()
+
+    recipe_dir = os.path.dirname(os.path.abspath(_recipe_path(args.path)))
+    lockfile = Lockfile(args.lockfile or os.path.join(recipe_dir, DEFAULT_LOCKFILE))
+    graph_args, install_args = _split_args(conan_args)
+    key = graph_key(args.path, graph_args)
+
+    if args.command == "refresh":
+        lockfile.create(args.path, graph_args, key, update=True)
+        return
+    if lockfile.is_valid(key):
+        print("Using lockfile {}".format(lockfile.path))
+    else:
+        if os.path.isfile(lockfile.path):
+            print("Lockfile {} is outdated (recipe, arguments or environ changed)".format(lockfile.path))
+        lockfile.create(args.path, graph_args, key)
+    lockfile.install(args.path, install_args)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except subprocess.CalledProcessError as e:
+        sys.exit(e.returncode)
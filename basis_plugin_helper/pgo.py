@@ -0,0 +1,55 @@
+import os, shutil, subprocess
+from basis_plugin_helper.fileutils import FileInstaller, file_digest, string_digest
+
+# profile merged by llvm-profdata, see `add_plugin_pgo_options`
+MERGED_PROFILE = "merged.profdata"
+GCC_PROFILE_EXTENSION = ".gcda"
+CLANG_RAW_PROFILE_EXTENSION = ".profraw"
+
+# Returns sorted paths (relative to `profile_dir`) of files that form profile
+def profile_files(profile_dir):
+    files = []
+    if not profile_dir or not os.path.isdir(profile_dir):
+        return files
+    for root, _, names in os.walk(profile_dir):
+        for name in names:
+            if name == MERGED_PROFILE or name.endswith(GCC_PROFILE_EXTENSION):
+                files.append(os.path.relpath(os.path.join(root, name), profile_dir))
+    return sorted(files)
+
+def has_profile(profile_dir):
+    return len(profile_files(profile_dir)) > 0
+
+def profile_digest(profile_dir):
+    return string_digest("\n".join(
+        "{}={}".format(relpath, file_digest(os.path.join(profile_dir, relpath)))
+        for relpath in profile_files(profile_dir)))
+
+def copy_profile(src_dir, dst_dir):
+    if os.path.isdir(dst_dir):
+        shutil.rmtree(dst_dir)
+    installer = FileInstaller("copy")
+    for relpath in profile_files(src_dir):
+        installer.install(os.path.join(src_dir, relpath), os.path.join(dst_dir, relpath))
+    return installer
+
+# Creates profile in `profile_dir` from profiles written by training runs to `raw_dir`.
+# Clang .profraw files are merged by llvm-profdata,
+# GCC .gcda files are merged by training runs themselves and only copied.
+def merge_profiles(raw_dir, profile_dir, llvm_profdata = None):
+    if llvm_profdata is None:
+        copy_profile(raw_dir, profile_dir)
+        return
+    # profile of previous training must not be used if training produced nothing
+    if os.path.isdir(profile_dir):
+        shutil.rmtree(profile_dir)
+    raw_profiles = []
+    for root, _, names in os.walk(raw_dir):
+        raw_profiles.extend(os.path.join(root, name) for name in names
+                            if name.endswith(CLANG_RAW_PROFILE_EXTENSION))
+    if not raw_profiles:
+        return
+    os.makedirs(profile_dir)
+    subprocess.check_call([llvm_profdata, "merge",
+                           "-output={}".format(os.path.join(profile_dir, MERGED_PROFILE))]
+                          + sorted(raw_profiles))
@@ -0,0 +1,74 @@
+import os, re
+from basis_plugin_helper.fileutils import FileInstaller, string_digest
+
+# libfoo.so, libfoo.so.1.2, libfoo.dylib, foo.dll
+SHARED_LIBRARY_RE = re.compile(r".*(\.so(\.\d+)*|\.dylib|\.dll)$")
+
+def is_shared_library(name):
+    return SHARED_LIBRARY_RE.match(name) is not None
+
+def _has_shared_libraries(path):
+    try:
+        return any(is_shared_library(name) for name in os.listdir(path))
+    except OSError:
+        return False
+
+# Removes duplicates (keeping order) and directories without shared libraries,
+# dynamic loader probes each of them for each needed library
+def shared_library_dirs(paths):
+    dirs = []
+    for path in paths:
+        path = os.path.normpath(path)
+        if path not in dirs and _has_shared_libraries(path):
+            dirs.append(path)
+    return dirs
+
+# Returns {dependency: [lib dirs relative to its package folder]}
+# of dirs that contain shared libraries, saved in package manifest
+# so consumers do not scan lib dirs of all dependencies
+def dependency_library_dirs(deps_cpp_info):
+    dirs = {}
+    for dep_name in deps_cpp_info.deps:
+        dep_info = deps_cpp_info[dep_name]
+        dirs[dep_name] = [os.path.relpath(path, dep_info.rootpath).replace(os.sep, "/")
+                          for path in shared_library_dirs(dep_info.lib_paths)]
+    return dirs
+
+# Returns deduplicated lib dirs of dependencies that contain shared libraries,
+# dependencies missing in `manifest_dirs` (see `dependency_library_dirs`) are scanned
+def resolve_dependency_library_dirs(deps_cpp_info, manifest_dirs):
+    dirs = []
+    for dep_name in deps_cpp_info.deps:
+        dep_info = deps_cpp_info[dep_name]
+        if dep_name in manifest_dirs:
+            paths = [os.path.normpath(os.path.join(dep_info.rootpath, path))
+                     for path in manifest_dirs[dep_name]]
+        else:
+            paths = shared_library_dirs(dep_info.lib_paths)
+        dirs.extend(path for path in paths if path not in dirs)
+    return dirs
+
+# Returns `dirs` relative to `package_folder`, used as RUNPATH of installed binaries
+# (see PLUGIN_INSTALL_RPATH_DIRS in Findbasis_plugin_helper.cmake)
+def package_relative_dirs(dirs, package_folder):
+    return [os.path.relpath(path, package_folder).replace(os.sep, "/") for path in dirs]
+
+def default_library_farm_dir(dirs):
+    home = os.getenv("CONAN_USER_HOME", os.path.expanduser("~"))
+    return os.path.join(home, ".conan", "runtime_library_farm",
+                        string_digest("\n".join(dirs))[:16])
+
+# Single directory with symlinks to shared libraries from all `dirs`.
+# If same library exists in several dirs, first one wins
+# (same as search order of LD_LIBRARY_PATH).
+def build_library_farm(dirs, farm_dir):
+    installer = FileInstaller("symlink")
+    linked = set()
+    for path in dirs:
+        for name in sorted(os.listdir(path)):
+            src = os.path.join(path, name)
+            if name in linked or not is_shared_library(name) or not os.path.isfile(src):
+                continue
+            linked.add(name)
+            installer.install(src, os.path.join(farm_dir, name))
+    return installer
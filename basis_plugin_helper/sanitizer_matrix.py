@@ -0,0 +1,212 @@
+import argparse, os, subprocess, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from basis_plugin_helper.fileutils import load_json, save_json
+from basis_plugin_helper.jobs import available_cpus, available_memory_mb, \
+    COMPILE_JOB_MEMORY_MB, LINK_JOB_MEMORY_MB
+
+# Builds and tests sanitizer variants of recipe in parallel from one source checkout.
+# `plugin_configure` allows one sanitizer per build (it is propagated
+# to basis, chromium_base, boost, etc.), so each variant is separate
+# `conan install` + `conan build` in its own build folder `{build root}/{variant}`.
+# CPU and memory budget is split between variants running at same time
+# (using CONAN_CPU_COUNT and BUILD_MEMORY_BUDGET_MB, see `BuildJobs`).
+#
+# USAGE:
+# python -m basis_plugin_helper.sanitizer_matrix . --variant asan --variant ubsan \
+#   --build-root build_sanitizers -- -pr clang -s build_type=Debug --build=missing
+#
+# Arguments after `--` are passed to `conan install`.
+# Combined report is written to {build root}/sanitizer_matrix.json,
+# output of each variant is written to {build root}/{variant}/sanitizer_matrix.log
+# NOTE: variants share conan cache, dependencies are built with sanitizer
+# options of variant (different package_id), conan locks cache for concurrent builds.
+#
+# `plugin_configure` requires static linking for all variants
+# and llvm_tools for compiler sanitizers, so each variant is built
+# with `-o shared=False` and ENABLE_LLVM_TOOLS=1 (except valgrind).
+
+# variant name -> recipe option, see `plugin_options`
+SANITIZER_OPTIONS = {
+    "asan": "enable_asan",
+    "ubsan": "enable_ubsan",
+    "msan": "enable_msan",
+    "tsan": "enable_tsan",
+    "valgrind": "enable_valgrind",
+}
+
+# variants that require llvm_tools, see `plugin_configure`
+LLVM_TOOLS_VARIANTS = ("asan", "ubsan", "msan", "tsan")
+
+# options that make `plugin_configure` reject sanitizer variants
+CONFLICTING_OPTIONS = {
+    "shared=true": "static linking",
+    "boost:no_exceptions=false": "boost without exceptions",
+}
+
+# memory required by one variant to run at least one compile and one link job
+VARIANT_MIN_MEMORY_MB = COMPILE_JOB_MEMORY_MB["sanitizer"] + LINK_JOB_MEMORY_MB["sanitizer"]
+
+REPORT_NAME = "sanitizer_matrix.json"
+LOG_NAME = "sanitizer_matrix.log"
+
+# Returns number of variants that run at same time
+def matrix_concurrency(variants, cpus, memory_mb):
+    concurrency = min(len(variants), cpus)
+    if memory_mb is not None:
+        concurrency = min(concurrency, memory_mb // VARIANT_MIN_MEMORY_MB)
+    return max(1, concurrency)
+
+# Returns error message if arguments of `conan install` conflict
+# with requirements of sanitizer builds, see `plugin_configure`
+def validate_conan_args(conan_args):
+    for index, arg in enumerate(conan_args[:-1]):
+        value = conan_args[index + 1].replace(" ", "").lower()
+        if arg in ("-o", "-o:h", "--options", "--options:host") and value in CONFLICTING_OPTIONS:
+            return "sanitizer variants require {}, remove {} {}".format(
+                CONFLICTING_OPTIONS[value], arg, conan_args[index + 1])
+    value = os.getenv("ENABLE_LLVM_TOOLS", os.getenv("enable_llvm_tools"))
+    if value is not None and value.lower() in ("n", "no", "f", "false", "off", "0"):
+        return "sanitizer variants require llvm_tools, unset ENABLE_LLVM_TOOLS"
+    return None
+
+# Splits CPUs and memory equally between variants running at same time
+def variant_budget(cpus, memory_mb, concurrency):
+    return (max(1, cpus // concurrency),
+            None if memory_mb is None else max(1, memory_mb // concurrency))
+
+def _test_summary(build_folder):
+    report = load_json(os.path.join(build_folder, "test_report.json"))
+    if report is None:
+        return None
+    summary = {}
+    for test in report.get("tests", []):
+        summary[test["status"]] = summary.get(test["status"], 0) + 1
+    return summary
+
+class SanitizerMatrix:
+    def __init__(self, path, build_root, conan_args, cpus, memory_mb, concurrency,
+                 conan_program = "conan"):
+        self.path = path
+        self.source_folder = os.path.dirname(os.path.abspath(
+            os.path.join(path, "conanfile.py") if os.path.isdir(path) else path))
+        self.build_root = os.path.abspath(build_root)
+        self.conan_args = conan_args
+        self.conan_program = conan_program
+        self.concurrency = concurrency
+        self.cpus, self.memory_mb = variant_budget(cpus, memory_mb, concurrency)
+
+    def build_folder(self, variant):
+        return os.path.join(self.build_root, variant)
+
+    def _environment(self, variant):
+        env = os.environ.copy()
+        if variant in LLVM_TOOLS_VARIANTS:
+            env["ENABLE_LLVM_TOOLS"] = "1"
+        env["CONAN_CPU_COUNT"] = str(self.cpus)
+        if self.memory_mb is not None:
+            env["BUILD_MEMORY_BUDGET_MB"] = str(self.memory_mb)
+        # timelines of variants must not overwrite each other
+        env.pop("BUILD_TIMELINE_DIR", None)
+        return env
+
+    def _commands(self, variant, build_folder):
+        install = [self.conan_program, "install", self.path,
+                   "-if", build_folder,
+                   "-o", "{}=True".format(SANITIZER_OPTIONS[variant]),
+                   "-o", "shared=False"] + self.conan_args
+        build = [self.conan_program, "build", self.path,
+                 "-if", build_folder, "-bf", build_folder, "-sf", self.source_folder]
+        return [("install", install), ("build", build)]
+
+    def run_variant(self, variant):
+        build_folder = self.build_folder(variant)
+        if not os.path.isdir(build_folder):
+            os.makedirs(build_folder)
+        # report of previous run must not be reported if build fails
+        test_report = os.path.join(build_folder, "test_report.json")
+        if os.path.exists(test_report):
+            os.remove(test_report)
+        result = {"variant": variant, "build_folder": build_folder,
+                  "status": "passed", "steps": {}}
+        print("[{}] started, {} CPUs, memory budget: {}".format(
+            variant, self.cpus, "unknown" if self.memory_mb is None else "{} MB".format(self.memory_mb)))
+        with open(os.path.join(build_folder, LOG_NAME), "w") as log:
+            for step, command in self._commands(variant, build_folder):
+                log.write("$ {}\n".format(" ".join(command)))
+                log.flush()
+                start = time.time()
+                returncode = subprocess.call(command, cwd=self.source_folder, env=self._environment(variant),
+                                             stdout=log, stderr=subprocess.STDOUT)
+                result["steps"][step] = round(time.time() - start, 3)
+                if returncode != 0:
+                    result["status"] = "failed"
+                    result["failed_step"] = step
+                    break
+        result["tests"] = _test_summary(build_folder)
+        print("[{}] {} in {:.1f} sec".format(variant, result["status"], sum(result["steps"].values())))
+        return result
+
+    def run(self, variants):
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            results = list(executor.map(self.run_variant, variants))
+        report = {
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "duration": round(time.time() - start, 3),
+            "concurrency": self.concurrency,
+            "variant_cpus": self.cpus,
+            "variant_memory_mb": self.memory_mb,
+            "conan_args": self.conan_args,
+            "variants": results,
+        }
+        save_json(os.path.join(self.build_root, REPORT_NAME), report)
+        return report
+
+def print_report(report):
+    print("Sanitizer matrix: {} variants in {:.1f} sec ({} at same time)".format(
+        len(report["variants"]), report["duration"], report["concurrency"]))
+    for result in report["variants"]:
+        tests = result["tests"]
+        tests = ", ".join("{} {}".format(count, status) for status, count in sorted(tests.items())) \
+            if tests else "no test report"
+        status = result["status"]
+        if status == "failed":
+            status = "failed ({})".format(result["failed_step"])
+        print("{:<10} {:<18} {:>8.1f} sec  {}  {}".format(
+            result["variant"], status, sum(result["steps"].values()), tests,
+            os.path.join(result["build_folder"], LOG_NAME)))
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m basis_plugin_helper.sanitizer_matrix")
+    parser.add_argument("path", help="recipe folder or conanfile.py")
+    parser.add_argument("--variant", action="append", choices=sorted(SANITIZER_OPTIONS),
+                        help="can be repeated, default: all")
+    parser.add_argument("--build-root", default="build_sanitizers")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="variants built at same time, default: detected from CPUs and memory")
+    parser.add_argument("--cpus", type=int, default=None,
+                        help="CPU budget of all variants, default: available CPUs")
+    parser.add_argument("conan_args", nargs=argparse.REMAINDER,
+                        help="arguments of `conan install`, after --")
+    args = parser.parse_args()
+
+    conan_args = args.conan_args[1:] if args.conan_args[:1] == ["--"] else args.conan_args
+    error = validate_conan_args(conan_args)
+    if error:
+        parser.error(error)
+    variants = args.variant or sorted(SANITIZER_OPTIONS)
+    # unique variants keep build folders separate
+    variants = [variant for index, variant in enumerate(variants) if variant not in variants[:index]]
+    cpus = args.cpus or available_cpus()
+    # respects BUILD_MEMORY_BUDGET_MB as budget of whole matrix
+    memory_mb = available_memory_mb()
+    concurrency = max(1, args.jobs) if args.jobs else matrix_concurrency(variants, cpus, memory_mb)
+
+    matrix = SanitizerMatrix(args.path, args.build_root, conan_args, cpus, memory_mb, concurrency)
+    report = matrix.run(variants)
+    print_report(report)
+    if any(result["status"] != "passed" for result in report["variants"]):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
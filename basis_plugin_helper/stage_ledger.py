@@ -0,0 +1,30 @@
+import os, time
+from basis_plugin_helper.fileutils import string_digest, load_json, save_json
+
+# Records which variants (build-only toggles and options) were processed
+# in build folder and which stages ran for them.
+# Variants that share build folder (same build_id) are built once,
+# conan calls only package() for others, see `CMakePackage.plugin_build_id`.
+class StageLedger:
+    def __init__(self, cache_dir):
+        self.path = os.path.join(cache_dir, "stage_ledger.json")
+        self.ledger = load_json(self.path, {})
+
+    @staticmethod
+    def variant_key(values):
+        return string_digest(repr(sorted(values.items())))[:16]
+
+    def is_done(self, variant_key):
+        return variant_key in self.ledger.get("variants", {})
+
+    # compiled tree changed, stages of other variants must run again
+    def reset(self):
+        self.ledger = {}
+
+    def record(self, variant_key, values, stages):
+        self.ledger.setdefault("variants", {})[variant_key] = {
+            "values": dict((name, str(value)) for name, value in values.items()),
+            "stages": stages,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        save_json(self.path, self.ledger)
@@ -0,0 +1,301 @@
+import json, os, re, subprocess, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
+from basis_plugin_helper.fileutils import file_digest, string_digest, load_json, save_json
+
+SHARED_LIBRARY_EXTENSIONS = (".so", ".dll", ".dylib")
+
+# dirs of build folder without libraries loaded by tests
+IGNORED_BUILD_DIRS = ("CMakeFiles", ".basis_plugin_helper", "build_time_benchmark")
+
+# environ variables that select shared libraries loaded by tests
+LIBRARY_PATH_ENVIRON = ("PATH", "LD_LIBRARY_PATH", "DYLD_LIBRARY_PATH")
+
+# tests with these CTest properties are run by ctest,
+# it runs setup and cleanup tests of fixtures
+FIXTURE_PROPERTIES = ("FIXTURES_REQUIRED", "FIXTURES_SETUP", "FIXTURES_CLEANUP")
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+class TestCase:
+    # properties: CTest properties that change result of test
+    # (WILL_FAIL, PASS_REGULAR_EXPRESSION, RESOURCE_LOCK, etc.)
+    def __init__(self, name, command, working_dir, environment, timeout, run_serial, labels = (),
+                 properties = None):
+        self.name = name
+        self.command = command
+        self.working_dir = working_dir
+        self.environment = environment
+        self.timeout = timeout
+        self.run_serial = run_serial
+        self.labels = labels
+        self.properties = properties or {}
+
+    @property
+    def resource_locks(self):
+        return sorted(_as_list(self.properties.get("RESOURCE_LOCK")))
+
+    @property
+    def uses_fixtures(self):
+        return any(self.properties.get(name) for name in FIXTURE_PROPERTIES)
+
+    # Returns "passed", "failed" or "skipped" like ctest does
+    # see https://cmake.org/cmake/help/latest/manual/cmake-properties.7.html#properties-on-tests
+    def status(self, returncode, output):
+        skip_return_code = self.properties.get("SKIP_RETURN_CODE")
+        if skip_return_code is not None and returncode == int(skip_return_code):
+            return "skipped"
+        if any(re.search(regex, output) for regex in _as_list(self.properties.get("SKIP_REGULAR_EXPRESSION"))):
+            return "skipped"
+        pass_regexes = _as_list(self.properties.get("PASS_REGULAR_EXPRESSION"))
+        if pass_regexes:
+            passed = any(re.search(regex, output) for regex in pass_regexes)
+        else:
+            passed = returncode == 0
+        if any(re.search(regex, output) for regex in _as_list(self.properties.get("FAIL_REGULAR_EXPRESSION"))):
+            passed = False
+        if self.properties.get("WILL_FAIL"):
+            passed = not passed
+        return "passed" if passed else "failed"
+
+# CTest properties stored in TestCase.properties
+RESULT_PROPERTIES = ("WILL_FAIL", "PASS_REGULAR_EXPRESSION", "FAIL_REGULAR_EXPRESSION",
+                     "SKIP_RETURN_CODE", "SKIP_REGULAR_EXPRESSION", "RESOURCE_LOCK") \
+    + FIXTURE_PROPERTIES
+
+# Lists tests registered by `add_test`, `gtest_discover_tests`, `catch_discover_tests`, etc.
+# Returns tests and names of tests with executables that are not built.
+# see https://cmake.org/cmake/help/latest/manual/ctest.1.html#show-as-json-object-model
+def discover_ctest_tests(build_folder, ctest_program = "ctest"):
+    output = subprocess.check_output([ctest_program, "--show-only=json-v1"], cwd=build_folder)
+    tests = []
+    missing = []
+    for test in json.loads(output.decode("utf-8")).get("tests", []):
+        if not test.get("command"):
+            missing.append(test["name"])
+            continue
+        properties = dict((prop["name"], prop["value"]) for prop in test.get("properties", []))
+        if properties.get("DISABLED"):
+            continue
+        environment = properties.get("ENVIRONMENT", [])
+        tests.append(TestCase(name=test["name"],
+                              command=test["command"],
+                              working_dir=properties.get("WORKING_DIRECTORY", build_folder),
+                              environment=dict(item.split("=", 1) for item in environment if "=" in item),
+                              timeout=properties.get("TIMEOUT"),
+                              run_serial=bool(properties.get("RUN_SERIAL")),
+                              labels=tuple(properties.get("LABELS", [])),
+                              properties=dict((name, value) for name, value in properties.items()
+                                              if name in RESULT_PROPERTIES)))
+    return tests, missing
+
+# Runs tests in parallel, slowest (by previous runs) first.
+# Tests with same RESOURCE_LOCK do not run at same time,
+# tests with fixtures are run by ctest one by one.
+# Skips tests that passed before if test executable, its arguments, environment,
+# shared libraries from build folder and from `library_dirs` (dependencies) did not change.
+class TestRunner:
+    def __init__(self, output, build_folder, cache_dir, jobs,
+                 shard_index = 0, total_shards = 1,
+                 use_cache = True, default_timeout = None, before_test = None,
+                 library_dirs = (), ctest_program = "ctest"):
+        self.output = output
+        self.build_folder = build_folder
+        self.library_dirs = library_dirs
+        self.ctest_program = ctest_program
+        self.resource_locks = {}
+        self.resource_locks_lock = threading.Lock()
+        self.jobs = max(1, jobs)
+        self.shard_index = shard_index
+        self.total_shards = max(1, total_shards)
+        self.use_cache = use_cache
+        self.default_timeout = default_timeout
+        # called with test before it is run (not called for cached tests)
+        self.before_test = before_test
+        self.timings_path = os.path.join(cache_dir, "test_timings.json")
+        self.passed_path = os.path.join(cache_dir, "test_passed.json")
+
+    # Digest of shared libraries in build folder and its subdirs
+    # (tests may load them at runtime, plugins), shared libraries of dependencies
+    # and environ variables used to find them.
+    # Libraries of dependencies are large and change only when package is rebuilt,
+    # their size and modification time are used.
+    def _runtime_inputs_digest(self):
+        digests = []
+        for root, dirs, files in os.walk(self.build_folder):
+            dirs[:] = sorted(name for name in dirs if name not in IGNORED_BUILD_DIRS)
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if (name.endswith(SHARED_LIBRARY_EXTENSIONS) or ".so." in name) \
+                        and os.path.isfile(path) and not os.path.islink(path):
+                    digests.append("{}={}".format(
+                        os.path.relpath(path, self.build_folder), file_digest(path)))
+        for library_dir in self.library_dirs:
+            if not os.path.isdir(library_dir):
+                continue
+            for name in sorted(os.listdir(library_dir)):
+                path = os.path.join(library_dir, name)
+                if (name.endswith(SHARED_LIBRARY_EXTENSIONS) or ".so." in name) and os.path.isfile(path):
+                    stat = os.stat(path)
+                    digests.append("{}={}:{}".format(path, stat.st_size, stat.st_mtime_ns))
+        for name in LIBRARY_PATH_ENVIRON:
+            digests.append("{}={}".format(name, os.getenv(name, "")))
+        return string_digest("\n".join(digests))
+
+    def _test_key(self, test, runtime_inputs_digest):
+        executable = test.command[0]
+        return string_digest(json.dumps({
+            "executable": file_digest(executable) if os.path.isfile(executable) else executable,
+            "command": test.command[1:],
+            "working_dir": test.working_dir,
+            "environment": test.environment,
+            "properties": test.properties,
+            "runtime_inputs": runtime_inputs_digest,
+        }, sort_keys=True))
+
+    # Tests are assigned to shards by name,
+    # so assignment does not depend on timings of current machine
+    def _select_shard(self, tests):
+        tests = sorted(tests, key=lambda test: test.name)
+        return [test for index, test in enumerate(tests)
+                if index % self.total_shards == self.shard_index]
+
+    def _resource_locks(self, test):
+        with self.resource_locks_lock:
+            return [self.resource_locks.setdefault(name, threading.Lock())
+                    for name in test.resource_locks]
+
+    # ctest runs setup and cleanup tests of fixtures required by test
+    def _ctest_command(self, test):
+        return [self.ctest_program, "--output-on-failure",
+                "-R", "^{}$".format(re.escape(test.name))]
+
+    def _run_test(self, test, key):
+        if self.before_test:
+            self.before_test(test)
+        # locks are acquired in sorted order, so tests can not deadlock
+        locks = self._resource_locks(test)
+        for lock in locks:
+            lock.acquire()
+        try:
+            return self._run_test_locked(test, key)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _run_test_locked(self, test, key):
+        env = os.environ.copy()
+        env.update(test.environment)
+        timeout = test.timeout or self.default_timeout
+        start = time.time()
+        try:
+            if test.uses_fixtures:
+                process = subprocess.run(self._ctest_command(test), cwd=self.build_folder, env=env,
+                                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                # ctest applies WILL_FAIL, regular expressions, etc.
+                status = "passed" if process.returncode == 0 else "failed"
+            else:
+                process = subprocess.run(test.command, cwd=test.working_dir, env=env,
+                                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                         timeout=float(timeout) if timeout else None)
+                status = test.status(process.returncode,
+                                     process.stdout.decode("utf-8", "replace"))
+            output = process.stdout
+        except subprocess.TimeoutExpired as e:
+            status = "timeout"
+            output = e.output or b""
+        duration = time.time() - start
+        self.output.info("{} {} ({:.2f} sec)".format(status.upper(), test.name, duration))
+        return {
+            "name": test.name,
+            "status": status,
+            "duration": duration,
+            "output": output.decode("utf-8", "replace"),
+            "key": key,
+        }
+
+    def run(self, tests):
+        timings = load_json(self.timings_path, {})
+        passed = load_json(self.passed_path, {}) if self.use_cache else {}
+        runtime_inputs_digest = self._runtime_inputs_digest()
+
+        tests = self._select_shard(tests)
+        if self.total_shards > 1:
+            self.output.info("Running shard {} of {}: {} tests".format(
+                self.shard_index, self.total_shards, len(tests)))
+
+        results = []
+        to_run = []
+        for test in tests:
+            key = self._test_key(test, runtime_inputs_digest)
+            if passed.get(test.name) == key:
+                results.append({"name": test.name, "status": "cached",
+                                "duration": 0.0, "output": "", "key": key})
+            else:
+                to_run.append((test, key))
+        if results:
+            self.output.info("Skipped {} unchanged tests that passed before".format(len(results)))
+
+        # slowest first, tests without timings are assumed to be slow
+        to_run.sort(key=lambda item: -timings.get(item[0].name, float("inf")))
+        # fixtures may share state (setup and cleanup tests), they are run one by one
+        parallel = [item for item in to_run if not item[0].run_serial and not item[0].uses_fixtures]
+        serial = [item for item in to_run if item[0].run_serial or item[0].uses_fixtures]
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            results.extend(executor.map(lambda item: self._run_test(*item), parallel))
+        for test, key in serial:
+            results.append(self._run_test(test, key))
+
+        for result in results:
+            if result["status"] == "cached":
+                continue
+            timings[result["name"]] = result["duration"]
+            if result["status"] == "passed":
+                passed[result["name"]] = result["key"]
+            else:
+                passed.pop(result["name"], None)
+        save_json(self.timings_path, timings)
+        save_json(self.passed_path, passed)
+        return results
+
+def write_json_report(results, path):
+    save_json(path, {
+        "tests": [dict((k, v) for k, v in result.items() if k != "key") for result in results],
+    })
+
+# see https://llg.cubic.org/docs/junit/
+def write_junit_report(results, path, suite_name):
+    failures = [r for r in results if r["status"] in ("failed", "timeout")]
+    skipped = [r for r in results if r["status"] in ("cached", "skipped")]
+    suite = ElementTree.Element("testsuite", {
+        "name": suite_name,
+        "tests": str(len(results)),
+        "failures": str(len(failures)),
+        "skipped": str(len(skipped)),
+        "time": "{:.3f}".format(sum(r["duration"] for r in results)),
+    })
+    for result in results:
+        case = ElementTree.SubElement(suite, "testcase", {
+            "classname": suite_name,
+            "name": result["name"],
+            "time": "{:.3f}".format(result["duration"]),
+        })
+        if result["status"] in ("failed", "timeout"):
+            failure = ElementTree.SubElement(case, "failure", {"message": result["status"]})
+            failure.text = result["output"]
+        elif result["status"] == "cached":
+            ElementTree.SubElement(case, "skipped", {"message": "unchanged since last passing run"})
+        elif result["status"] == "skipped":
+            ElementTree.SubElement(case, "skipped", {"message": "skipped by test"})
+        elif result["output"]:
+            system_out = ElementTree.SubElement(case, "system-out")
+            system_out.text = result["output"]
+    testsuites = ElementTree.Element("testsuites")
+    testsuites.append(suite)
+    ElementTree.ElementTree(testsuites).write(path, encoding="utf-8", xml_declaration=True)
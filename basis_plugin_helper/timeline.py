@@ -0,0 +1,265 @@
+import functools, itertools, os, sys, threading, time
+from contextlib import contextmanager
+from basis_plugin_helper.fileutils import load_json, save_json
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+# number of previous processes (conan commands) kept in timeline file
+MAX_PROCESSES = 10
+
+OBJECT_EXTENSIONS = (".o", ".obj")
+LINK_EXTENSIONS = (".so", ".dylib", ".dll", ".exe")
+
+# interval of RSS sampling during stages
+RSS_SAMPLE_INTERVAL_SEC = 0.5
+
+# distinguishes timelines of conanfile instances in same process
+# (test_package under `conan create`, consumers, etc.)
+_instance_counter = itertools.count()
+
+# Lifetime high-water mark of current process and all waited children,
+# used if RSS of process tree can not be sampled (no /proc)
+def _lifetime_peak_rss_mb():
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # bytes on macOS, kilobytes on Linux
+    if sys.platform == "darwin":
+        return peak // (1024 * 1024)
+    return peak // 1024
+
+# Returns RSS (in MB) of current process and all its descendants
+# or None if /proc is not available
+def _process_tree_rss_mb():
+    if not os.path.isdir("/proc/self"):
+        return None
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(name)) as f:
+                # "pid (comm) state ppid ...", comm may contain spaces
+                ppid = int(f.read().rpartition(")")[2].split()[1])
+        except (IOError, OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(name))
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    rss = 0
+    pids = [os.getpid()]
+    while pids:
+        pid = pids.pop()
+        pids.extend(children.get(pid, []))
+        try:
+            with open("/proc/{}/statm".format(pid)) as f:
+                rss += int(f.read().split()[1]) * page_size
+        except (IOError, OSError, ValueError, IndexError):
+            continue
+    return rss // (1024 * 1024)
+
+# Samples RSS of process tree in background thread while stages are active,
+# each active stage gets peak of samples taken during it
+class RssSampler:
+    def __init__(self):
+        self.active = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.enabled = _process_tree_rss_mb() is not None
+
+    def _sample(self):
+        rss = _process_tree_rss_mb()
+        with self.lock:
+            for peak in self.active:
+                peak[0] = max(peak[0], rss)
+
+    def _loop(self):
+        while True:
+            time.sleep(RSS_SAMPLE_INTERVAL_SEC)
+            with self.lock:
+                if not self.active:
+                    self.thread = None
+                    return
+            self._sample()
+
+    # Returns mutable [peak] updated until `stop`
+    def start(self):
+        peak = [0]
+        with self.lock:
+            self.active.append(peak)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, daemon=True)
+                self.thread.start()
+        self._sample()
+        return peak
+
+    def stop(self, peak):
+        self._sample()
+        with self.lock:
+            self.active.remove(peak)
+        return peak[0]
+
+def _cpu_seconds():
+    times = os.times()
+    # user + system time of current process and waited children
+    return times[0] + times[1] + times[2] + times[3]
+
+# Records wall time, CPU time and peak RSS of build stages
+# in Chrome trace format (open in chrome://tracing or https://ui.perfetto.dev)
+# see https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+#
+# NOTE: conan builds packages of graph one by one in single process,
+# so stages of all packages are placed on same rows of same process.
+class Timeline:
+    def __init__(self, package_name):
+        self.pid = os.getpid()
+        self.instance = "{}-{}".format(self.pid, next(_instance_counter))
+        self.package_name = package_name
+        self.events = []
+        self.depth = 0
+        self.rss_sampler = RssSampler()
+
+    @contextmanager
+    def stage(self, name, category = "stage"):
+        start = time.time()
+        start_cpu = _cpu_seconds()
+        peak_rss = self.rss_sampler.start() if self.rss_sampler.enabled else None
+        self.depth += 1
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.depth -= 1
+            args = {"cpu_sec": round(_cpu_seconds() - start_cpu, 3)}
+            if peak_rss is not None:
+                # peak of sampled RSS of current process and its children during stage
+                args["peak_rss_mb"] = self.rss_sampler.stop(peak_rss)
+            else:
+                # NOTE: not per stage, same value for all stages after heaviest one
+                args["lifetime_peak_rss_mb"] = _lifetime_peak_rss_mb()
+            if failed:
+                args["failed"] = True
+            self.add_event("{} {}".format(self.package_name, name),
+                           category, start, time.time() - start, args)
+
+    def add_event(self, name, category, start, duration, args = None, tid = 0):
+        self.events.append({
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": int(start * 1000000),
+            "dur": int(duration * 1000000),
+            "pid": self.pid,
+            "tid": tid,
+            "args": dict(args or {}, timeline=self.instance),
+        })
+
+    # Adds compile and link steps from `.ninja_log`.
+    # offset: size of `.ninja_log` before build, older entries are ignored
+    # start: time when ninja was started, entries in `.ninja_log` are relative to it
+    # see https://github.com/ninja-build/ninja/blob/master/src/build_log.cc
+    def add_ninja_log(self, path, offset, start):
+        entries = read_ninja_log(path, offset)
+        # place parallel steps on separate lanes
+        lanes_end = []
+        for entry_start, entry_end, output in sorted(entries):
+            for lane, lane_end in enumerate(lanes_end):
+                if lane_end <= entry_start:
+                    lanes_end[lane] = entry_end
+                    break
+            else:
+                lane = len(lanes_end)
+                lanes_end.append(entry_end)
+            self.add_event(os.path.basename(output), ninja_step_category(output),
+                           start + entry_start / 1000.0,
+                           (entry_end - entry_start) / 1000.0,
+                           {"output": output, "package": self.package_name},
+                           tid = lane + 1)
+
+    def metadata_events(self):
+        return [{
+            "name": "process_name",
+            "ph": "M",
+            "pid": self.pid,
+            "args": {"name": "conan (pid {})".format(self.pid)},
+        }]
+
+    # Merges with events from previous conan commands
+    # and other conanfile instances of same process stored in same file
+    def save(self, path):
+        previous = load_json(path, {}).get("traceEvents", [])
+        previous = [event for event in previous
+                    if event.get("args", {}).get("timeline") != self.instance
+                    and not (event.get("ph") == "M" and event.get("pid") == self.pid)]
+        pids = []
+        for event in previous:
+            if event.get("pid") not in pids:
+                pids.append(event.get("pid"))
+        keep_pids = pids[-(MAX_PROCESSES - 1):] if MAX_PROCESSES > 1 else []
+        previous = [event for event in previous if event.get("pid") in keep_pids]
+        save_json(path, {
+            "traceEvents": previous + self.metadata_events() + self.events,
+            "displayTimeUnit": "ms",
+        })
+
+# compile, link (shared libraries and executables)
+# or other (static archives, precompiled headers, generated files, etc.)
+def ninja_step_category(output):
+    if output.endswith(OBJECT_EXTENSIONS):
+        return "compile"
+    name = os.path.basename(output)
+    # outputs of custom commands in CMakeFiles are not executables
+    if "CMakeFiles" in output.replace("\\", "/").split("/"):
+        return "other"
+    if name.endswith(LINK_EXTENSIONS) or ".so." in name or "." not in name:
+        return "link"
+    return "other"
+
+# Returns list of (start_ms, end_ms, output)
+def read_ninja_log(path, offset = 0):
+    if not os.path.isfile(path):
+        return []
+    if os.path.getsize(path) < offset:
+        # ninja recompacted log
+        offset = 0
+    entries = {}
+    with open(path) as f:
+        f.seek(offset)
+        for line in f:
+            if line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 4:
+                continue
+            # latest entry wins
+            entries[fields[3]] = (int(fields[0]), int(fields[1]), fields[3])
+    return list(entries.values())
+
+def timed_stage(name):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self._timed_stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def merge_timelines(paths, out_path):
+    events = []
+    for path in paths:
+        events.extend(load_json(path, {}).get("traceEvents", []))
+    save_json(out_path, {"traceEvents": events, "displayTimeUnit": "ms"})
+
+# USAGE:
+# python -m basis_plugin_helper.timeline merged.json $BUILD_TIMELINE_DIR/*.json
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit("usage: python -m basis_plugin_helper.timeline OUT_FILE TIMELINE_FILE...")
+    merge_timelines(sys.argv[2:], sys.argv[1])
@@ -0,0 +1,104 @@
+# Measures import time of basis_plugin_helper modules
+# and load (import + evaluation) time of synthetic graph of recipes
+# based on CMakePackage and HeaderOnlyPackage.
+#
+# Each repetition runs in fresh python process, `conans` is imported
+# before measurement (conan has it loaded anyway).
+#
+# USAGE:
+# python benchmarks/recipe_load_benchmark.py --packages 300 --repeat 5
+import argparse, json, os, statistics, subprocess, sys, tempfile
+
+CMAKE_RECIPE = """
+from conans import CMake
+from basis_plugin_helper.cmake import CMakePackage
+
+class Pkg{index}(CMakePackage):
+    name = "pkg{index}"
+    version = "0.0.1"
+    options = CMakePackage.plugin_options
+    default_options = CMakePackage.plugin_default_options
+    settings = CMakePackage.plugin_settings
+    exports_sources = CMakePackage.plugin_exports_sources
+    generators = CMakePackage.plugin_generators
+
+    def package_id(self):
+        self.plugin_package_id()
+"""
+
+HEADER_ONLY_RECIPE = """
+from basis_plugin_helper.headeronly import HeaderOnlyPackage
+
+class Pkg{index}(HeaderOnlyPackage):
+    name = "pkg{index}"
+    version = "0.0.1"
+"""
+
+MEASURE_SCRIPT = """
+import importlib.util, json, sys, time
+import conans
+from conans.client.output import ConanOutput
+
+recipes = sys.argv[1:]
+
+start = time.perf_counter()
+import basis_plugin_helper.cmake
+import basis_plugin_helper.headeronly
+helper_import = time.perf_counter() - start
+
+output = ConanOutput(sys.stdout)
+start = time.perf_counter()
+for index, path in enumerate(recipes):
+    # conan loads each recipe as new module
+    spec = importlib.util.spec_from_file_location("conanfile_%d" % index, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    conanfile_class = getattr(module, "Pkg%d" % index)
+    conanfile = conanfile_class(output, None, display_name="pkg%d" % index)
+    if hasattr(conanfile, "_binary_environ_options"):
+        conanfile._binary_environ_options()
+recipes_load = time.perf_counter() - start
+
+print(json.dumps({"helper_import": helper_import, "recipes_load": recipes_load}))
+"""
+
+def generate_recipes(folder, packages, header_only_ratio):
+    paths = []
+    header_only_every = int(1 / header_only_ratio) if header_only_ratio > 0 else 0
+    for index in range(packages):
+        is_header_only = header_only_every and index % header_only_every == 0
+        template = HEADER_ONLY_RECIPE if is_header_only else CMAKE_RECIPE
+        path = os.path.join(folder, "pkg{}".format(index), "conanfile.py")
+        os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write(template.format(index=index))
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--packages", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--header-only-ratio", type=float, default=0.25)
+    args = parser.parse_args()
+
+    helper_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [helper_root, env.get("PYTHONPATH")]))
+
+    with tempfile.TemporaryDirectory() as folder:
+        recipes = generate_recipes(folder, args.packages, args.header_only_ratio)
+        results = []
+        for _ in range(args.repeat):
+            output = subprocess.check_output([sys.executable, "-c", MEASURE_SCRIPT] + recipes, env=env)
+            results.append(json.loads(output.decode("utf-8").strip().splitlines()[-1]))
+
+    for key in ("helper_import", "recipes_load"):
+        timings = [result[key] * 1000 for result in results]
+        print("{:<16} median {:8.2f} ms, min {:8.2f} ms, max {:8.2f} ms".format(
+            key, statistics.median(timings), min(timings), max(timings)))
+    print("{} recipes, {:.3f} ms per recipe".format(args.packages,
+        statistics.median(result["recipes_load"] for result in results) * 1000 / args.packages))
+
+if __name__ == "__main__":
+    main()
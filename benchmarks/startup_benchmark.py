@@ -0,0 +1,109 @@
+# Measures process startup and plugin dlopen time
+# with different LD_LIBRARY_PATH values (runtime library layouts).
+#
+# With --call also measures dlsym and first call of plugin entry point
+# (for example `pluginVersion`) and prints size of dynamic symbol table,
+# use it to compare plugins built with and without ENABLE_PLUGIN_EXPORT_MAP.
+#
+# USAGE:
+# python benchmarks/startup_benchmark.py --runs 50 \
+#   --variant "paths=$(. ./activate_run.sh && echo $LD_LIBRARY_PATH)" \
+#   --variant "farm=$HOME/.conan/runtime_library_farm/0123456789abcdef" \
+#   --dlopen ./my_plugin.so \
+#   -- ./my_plugin_host --version
+#
+# python benchmarks/startup_benchmark.py --runs 50 --bind lazy \
+#   --dlopen ./default/my_plugin.so --dlopen ./export_map/my_plugin.so \
+#   --call pluginVersion
+import argparse, os, shutil, statistics, subprocess, sys, time
+
+# runs in fresh process, so loader caches are not shared between runs
+# prints dlopen time and time of dlsym + first call of each symbol
+DLOPEN_SCRIPT = """
+import ctypes, os, sys, time
+mode = os.RTLD_LAZY if sys.argv[2] == "lazy" else os.RTLD_NOW
+start = time.perf_counter()
+library = ctypes.CDLL(sys.argv[1], mode=mode | os.RTLD_GLOBAL)
+timings = [time.perf_counter() - start]
+for symbol in sys.argv[3:]:
+    start = time.perf_counter()
+    function = getattr(library, symbol)
+    function.restype = ctypes.c_void_p
+    function()
+    timings.append(time.perf_counter() - start)
+print(" ".join(str(timing) for timing in timings))
+"""
+
+def measure_command(command, env, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+# Returns list of timings of dlopen and of each call
+def measure_dlopen(path, env, runs, bind = "now", calls = ()):
+    timings = [[] for _ in range(len(calls) + 1)]
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, "-c", DLOPEN_SCRIPT, path, bind] + list(calls), env=env)
+        for index, timing in enumerate(output.decode("utf-8").split()):
+            timings[index].append(float(timing))
+    return timings
+
+# Number of defined dynamic symbols or None if nm is not found
+def count_dynamic_symbols(path):
+    nm = shutil.which("nm")
+    if not nm:
+        return None
+    output = subprocess.check_output([nm, "-D", "--defined-only", path])
+    return len(output.decode("utf-8", "replace").splitlines())
+
+def report(variant, what, timings):
+    print("{:<16} {:<40} median {:8.2f} ms, min {:8.2f} ms, max {:8.2f} ms".format(
+        variant, what,
+        statistics.median(timings) * 1000, min(timings) * 1000, max(timings) * 1000))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--variant", action="append", default=[],
+                        help="NAME=LD_LIBRARY_PATH, can be repeated")
+    parser.add_argument("--dlopen", action="append", default=[],
+                        help="shared library (plugin) to dlopen, can be repeated")
+    parser.add_argument("--call", action="append", default=[],
+                        help="function without arguments to call after dlopen, can be repeated")
+    parser.add_argument("--bind", choices=("now", "lazy"), default="now",
+                        help="RTLD_NOW or RTLD_LAZY, with lazy binding symbols are resolved on first call")
+    parser.add_argument("command", nargs=argparse.REMAINDER,
+                        help="command to run, after --")
+    args = parser.parse_args()
+
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not args.variant:
+        args.variant = ["current=" + os.getenv("LD_LIBRARY_PATH", "")]
+    if not command and not args.dlopen:
+        parser.error("nothing to measure, pass command and/or --dlopen")
+
+    for variant in args.variant:
+        name, _, library_path = variant.partition("=")
+        env = os.environ.copy()
+        env["LD_LIBRARY_PATH"] = library_path
+        print("{}: {} dirs in LD_LIBRARY_PATH".format(
+            name, len([path for path in library_path.split(os.pathsep) if path])))
+        if command:
+            report(name, " ".join(command)[:40], measure_command(command, env, args.runs))
+        for path in args.dlopen:
+            timings = measure_dlopen(path, env, args.runs, args.bind, args.call)
+            report(name, "dlopen " + path, timings[0])
+            for symbol, call_timings in zip(args.call, timings[1:]):
+                report(name, "first call " + symbol, call_timings)
+
+    for path in args.dlopen:
+        symbols = count_dynamic_symbols(path)
+        if symbols is not None:
+            print("{}: {} dynamic symbols, {} bytes".format(path, symbols, os.path.getsize(path)))
+
+if __name__ == "__main__":
+    main()
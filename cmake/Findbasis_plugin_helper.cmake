@@ -1,5 +1,24 @@
 # cmake utils
 
+# used to find scripts placed near this file
+set(BASIS_PLUGIN_HELPER_CMAKE_DIR ${CMAKE_CURRENT_LIST_DIR})
+
+# RUNPATH of installed binaries, set by CMakePackage if ENABLE_RUNPATH is set:
+# dirs relative to package folder, installed binaries (lib/ or bin/ of package)
+# find them relative to own location, so RUNPATH stays valid if conan cache is moved.
+# $ORIGIN is added here, not by CMakePackage: conan passes definitions through shell.
+if(PLUGIN_INSTALL_RPATH_DIRS)
+  if(APPLE)
+    set(_PLUGIN_RPATH_ORIGIN "@loader_path")
+  else()
+    set(_PLUGIN_RPATH_ORIGIN "$ORIGIN")
+  endif()
+  set(CMAKE_INSTALL_RPATH "")
+  foreach(_PLUGIN_RPATH_DIR ${PLUGIN_INSTALL_RPATH_DIRS})
+    list(APPEND CMAKE_INSTALL_RPATH "${_PLUGIN_RPATH_ORIGIN}/../${_PLUGIN_RPATH_DIR}")
+  endforeach()
+endif(PLUGIN_INSTALL_RPATH_DIRS)
+
 macro(set_common_plugin_options _PROJECT_NAME)
   if(NOT PROJECT_NAME)
     message(FATAL_ERROR
@@ -79,9 +98,55 @@ macro(set_common_plugin_options _PROJECT_NAME)
   option(ENABLE_LTO
     "Enable Link Time Optimization" OFF)
 
+  # profile-guided optimization phase, set by CMakePackage if ENABLE_PGO is set:
+  #   "generate" - instrumented build, training runs write profile to PGO_PROFILE_DIR
+  #   "use" - optimized build using profile from PGO_PROFILE_DIR
+  set(PGO_MODE "" CACHE STRING
+    "Profile-guided optimization phase: generate, use or empty")
+  set_property(CACHE PGO_MODE PROPERTY STRINGS "" generate use)
+
+  set(PGO_PROFILE_DIR "" CACHE PATH
+    "Directory of profile-guided optimization profile")
+
+  # NOTE: requires CMake 3.16
+  # see https://cmake.org/cmake/help/latest/command/target_precompile_headers.html
+  option(ENABLE_PCH
+    "Enable precompiled headers" OFF)
+
+  # NOTE: requires CMake 3.16
+  # see https://cmake.org/cmake/help/latest/prop_tgt/UNITY_BUILD.html
+  option(ENABLE_UNITY_BUILD
+    "Enable unity builds" OFF)
+
+  # adds TARGET_NAME_build_time_benchmark target to each plugin library,
+  # see `add_plugin_build_time_benchmark`
+  option(ENABLE_BUILD_TIME_BENCHMARK
+    "Add targets that compare build time with and without PCH and unity build" OFF)
+
+  set(UNITY_BUILD_BATCH_SIZE 8 CACHE STRING
+    "Number of source files combined into single unity source file")
+
   option(USE_LD_GOLD
     "Use GNU gold linker" OFF)
 
+  # see https://gcc.gnu.org/wiki/Visibility
+  option(ENABLE_PLUGIN_EXPORT_MAP
+    "Build plugin libraries with hidden visibility and export only plugin entry points" OFF)
+
+  # passed as -fuse-ld=, overrides USE_LD_GOLD
+  set(PLUGIN_LINKER "" CACHE STRING
+    "Linker used by plugin libraries: bfd, gold, lld or mold (empty for compiler default)")
+  set_property(CACHE PLUGIN_LINKER PROPERTY STRINGS "" bfd gold lld mold)
+
+  # debug info in .dwo files near object files,
+  # linker does not need to process it
+  # see https://gcc.gnu.org/wiki/DebugFission
+  option(ENABLE_SPLIT_DWARF
+    "Enable -gsplit-dwarf and --gdb-index" OFF)
+
+  option(ENABLE_COMPRESSED_DEBUG_SECTIONS
+    "Compress debug sections (-gz)" OFF)
+
   option(USE_CCACHE
     "Use CCACHE" OFF)
 
@@ -307,6 +372,35 @@ macro(set_common_plugin_modules)
     ENTT_USE_ATOMIC=1
     DISABLE_DOCTEST=1 # TODO: DISABLE_DOCTEST
   )
+
+  # symbols exported by plugin libraries if ENABLE_PLUGIN_EXPORT_MAP is set,
+  # glob patterns of version script (extern "C" names),
+  # override per plugin using ${_LIB_NAME}_EXPORTED_SYMBOLS
+  if(NOT DEFINED COMMON_PLUGIN_EXPORTED_SYMBOLS)
+    set(COMMON_PLUGIN_EXPORTED_SYMBOLS
+      # pluginVersion, pluginInstancer, pluginInitializer, pluginFinalizer, pluginInterface
+      # see CORRADE_PLUGIN_REGISTER
+      plugin*
+      # used by code generated by cling
+      cling_runtime_internal_throwIfInvalidPointer
+    )
+  endif()
+
+  # same as COMMON_PLUGIN_EXPORTED_SYMBOLS, but demangled C++ names,
+  # override per plugin using ${_LIB_NAME}_EXPORTED_CXX_SYMBOLS
+  if(NOT DEFINED COMMON_PLUGIN_EXPORTED_CXX_SYMBOLS)
+    set(COMMON_PLUGIN_EXPORTED_CXX_SYMBOLS
+      cling::runtime::internal::*
+    )
+  endif()
+
+  # headers precompiled for every plugin if ENABLE_PCH is set,
+  # empty by default: headers that are not used by plugin only slow down its build.
+  # Set per plugin using ${_LIB_NAME}_PCH_HEADERS, for example:
+  # set(my_plugin_PCH_HEADERS <memory> <string> <vector> <base/logging.h>)
+  if(NOT DEFINED COMMON_PLUGIN_PCH_HEADERS)
+    set(COMMON_PLUGIN_PCH_HEADERS "")
+  endif()
 endmacro(set_common_plugin_modules)
 
 # $<INSTALL_INTERFACE:...> is exported using install(EXPORT)
@@ -439,6 +533,48 @@ macro(add_plugin_library _CONFIG_FILE_PATH _LIB_NAME _CORE_LIB_TYPE _SOURCES)
     )
   endif(ENABLE_CLANG_FROM_CONAN)
 
+  ## ---------------------------- precompiled headers -------------------------------- ##
+  if(ENABLE_PCH)
+    if(CMAKE_VERSION VERSION_LESS 3.16)
+      message(WARNING "ENABLE_PCH requires CMake 3.16")
+    else()
+      if(NOT DEFINED ${_LIB_NAME}_PCH_HEADERS)
+        set(${_LIB_NAME}_PCH_HEADERS ${COMMON_PLUGIN_PCH_HEADERS})
+      endif()
+      if(${_LIB_NAME}_PCH_HEADERS)
+        message(STATUS "enabling PCH on ${_LIB_NAME}")
+        target_precompile_headers(${_LIB_NAME} PRIVATE
+          ${${_LIB_NAME}_PCH_HEADERS})
+      else()
+        message(STATUS "ENABLE_PCH is set, but ${_LIB_NAME}_PCH_HEADERS is empty")
+      endif()
+    endif()
+  endif(ENABLE_PCH)
+
+  ## ---------------------------- unity build -------------------------------- ##
+  if(ENABLE_UNITY_BUILD)
+    if(CMAKE_VERSION VERSION_LESS 3.16)
+      message(WARNING "ENABLE_UNITY_BUILD requires CMake 3.16")
+    else()
+      if(NOT DEFINED ${_LIB_NAME}_UNITY_BUILD_BATCH_SIZE)
+        set(${_LIB_NAME}_UNITY_BUILD_BATCH_SIZE ${UNITY_BUILD_BATCH_SIZE})
+      endif()
+      message(STATUS "enabling unity build on ${_LIB_NAME} with batch size ${${_LIB_NAME}_UNITY_BUILD_BATCH_SIZE}")
+      set_target_properties(${_LIB_NAME} PROPERTIES
+        UNITY_BUILD ON
+        UNITY_BUILD_BATCH_SIZE ${${_LIB_NAME}_UNITY_BUILD_BATCH_SIZE})
+    endif()
+  endif(ENABLE_UNITY_BUILD)
+
+  if(ENABLE_BUILD_TIME_BENCHMARK)
+    add_plugin_build_time_benchmark(${_LIB_NAME})
+  endif(ENABLE_BUILD_TIME_BENCHMARK)
+
+  ## ---------------------------- symbol visibility -------------------------------- ##
+  if(ENABLE_PLUGIN_EXPORT_MAP)
+    add_plugin_export_map(${_LIB_NAME})
+  endif(ENABLE_PLUGIN_EXPORT_MAP)
+
   ## ---------------------------- Link Time Optimization -------------------------------- ##
   if(ENABLE_LTO)
     # Check for LTO support (needs to be after project(...) )
@@ -452,6 +588,11 @@ macro(add_plugin_library _CONFIG_FILE_PATH _LIB_NAME _CORE_LIB_TYPE _SOURCES)
     endif()
   endif(ENABLE_LTO)
 
+  ## ---------------------------- profile-guided optimization -------------------------------- ##
+  if(PGO_MODE)
+    add_plugin_pgo_options(${_LIB_NAME})
+  endif(PGO_MODE)
+
   list(APPEND ClangErrorFlags
     -Werror=thread-safety
     -Werror=thread-safety-analysis
@@ -1102,13 +1243,20 @@ macro(add_plugin_library _CONFIG_FILE_PATH _LIB_NAME _CORE_LIB_TYPE _SOURCES)
 
   ## ---------------------------- gold linker -------------------------------- ##
   # add_gold_linker
-  if(USE_LD_GOLD)
+  if(USE_LD_GOLD AND NOT PLUGIN_LINKER)
     add_gold_linker() # from cmake_helper_utils (conan package)
-  endif(USE_LD_GOLD)
+  endif(USE_LD_GOLD AND NOT PLUGIN_LINKER)
+
+  ## ---------------------------- linker and debug info -------------------------------- ##
+  add_plugin_link_options(${_LIB_NAME})
 
   ## ---------------------------- ccache -------------------------------- ##
   if(USE_CCACHE)
-    add_ccache()
+    # CMakePackage sets CMAKE_<LANG>_COMPILER_LAUNCHER,
+    # do not wrap compiler twice
+    if(NOT CMAKE_CXX_COMPILER_LAUNCHER)
+      add_ccache()
+    endif()
     target_ccache_summary(${LIB_NAME}) # from cmake_helper_utils (conan package)
   endif(USE_CCACHE)
 
@@ -1137,6 +1285,292 @@ macro(add_plugin_library _CONFIG_FILE_PATH _LIB_NAME _CORE_LIB_TYPE _SOURCES)
   )
 endmacro(add_plugin_library)
 
+# Applies PLUGIN_LINKER, ENABLE_SPLIT_DWARF, ENABLE_COMPRESSED_DEBUG_SECTIONS
+# and debug prefix map of USE_CCACHE to target.
+# Also use it for test executables of plugin, they link same dependencies.
+# Unsupported flags are skipped with warning.
+macro(add_plugin_link_options _TARGET_NAME)
+  include(CheckCXXSourceCompiles)
+
+  if(PLUGIN_LINKER)
+    set(CMAKE_REQUIRED_FLAGS "-fuse-ld=${PLUGIN_LINKER}")
+    check_cxx_source_compiles("int main() { return 0; }"
+      PLUGIN_LINKER_${PLUGIN_LINKER}_SUPPORTED)
+    unset(CMAKE_REQUIRED_FLAGS)
+    if(PLUGIN_LINKER_${PLUGIN_LINKER}_SUPPORTED)
+      message(STATUS "using ${PLUGIN_LINKER} linker for ${_TARGET_NAME}")
+      target_link_options(${_TARGET_NAME} PRIVATE -fuse-ld=${PLUGIN_LINKER})
+    else()
+      message(WARNING "linker ${PLUGIN_LINKER} is not supported by compiler")
+    endif()
+  endif(PLUGIN_LINKER)
+
+  if(ENABLE_SPLIT_DWARF)
+    set(CMAKE_REQUIRED_FLAGS "-gsplit-dwarf")
+    check_cxx_source_compiles("int main() { return 0; }"
+      PLUGIN_SPLIT_DWARF_SUPPORTED)
+    unset(CMAKE_REQUIRED_FLAGS)
+    if(PLUGIN_SPLIT_DWARF_SUPPORTED)
+      message(STATUS "enabling split DWARF on ${_TARGET_NAME}")
+      target_compile_options(${_TARGET_NAME} PRIVATE
+        $<$<OR:$<CONFIG:Debug>,$<CONFIG:RelWithDebInfo>>:-gsplit-dwarf>)
+    else()
+      message(WARNING "-gsplit-dwarf is not supported by compiler")
+    endif()
+
+    # index for fast gdb startup with split DWARF,
+    # not supported by GNU ld (bfd)
+    if(PLUGIN_LINKER AND NOT PLUGIN_LINKER STREQUAL "bfd")
+      set(_GDB_INDEX_LINKER ${PLUGIN_LINKER})
+    elseif(USE_LD_GOLD)
+      set(_GDB_INDEX_LINKER gold)
+    else()
+      set(_GDB_INDEX_LINKER "")
+    endif()
+    if(_GDB_INDEX_LINKER)
+      set(CMAKE_REQUIRED_FLAGS "-fuse-ld=${_GDB_INDEX_LINKER} -Wl,--gdb-index")
+      check_cxx_source_compiles("int main() { return 0; }"
+        PLUGIN_GDB_INDEX_${_GDB_INDEX_LINKER}_SUPPORTED)
+      unset(CMAKE_REQUIRED_FLAGS)
+      if(PLUGIN_GDB_INDEX_${_GDB_INDEX_LINKER}_SUPPORTED)
+        target_link_options(${_TARGET_NAME} PRIVATE
+          $<$<OR:$<CONFIG:Debug>,$<CONFIG:RelWithDebInfo>>:-Wl,--gdb-index>)
+      endif()
+    endif()
+  endif(ENABLE_SPLIT_DWARF)
+
+  if(ENABLE_COMPRESSED_DEBUG_SECTIONS)
+    set(CMAKE_REQUIRED_FLAGS "-gz")
+    check_cxx_source_compiles("int main() { return 0; }"
+      PLUGIN_COMPRESSED_DEBUG_SECTIONS_SUPPORTED)
+    unset(CMAKE_REQUIRED_FLAGS)
+    if(PLUGIN_COMPRESSED_DEBUG_SECTIONS_SUPPORTED)
+      message(STATUS "enabling compressed debug sections on ${_TARGET_NAME}")
+      target_compile_options(${_TARGET_NAME} PRIVATE -gz)
+      target_link_options(${_TARGET_NAME} PRIVATE -gz)
+    else()
+      message(WARNING "-gz is not supported by compiler")
+    endif()
+  endif(ENABLE_COMPRESSED_DEBUG_SECTIONS)
+
+  # CMakePackage sets CCACHE_NOHASHDIR, so objects compiled in other build folder
+  # are reused. Build folder must not be stored in their debug info
+  # (DW_AT_comp_dir), see https://ccache.dev/manual/latest.html#_compiling_in_different_directories
+  if(USE_CCACHE)
+    set(CMAKE_REQUIRED_FLAGS "-fdebug-prefix-map=${CMAKE_BINARY_DIR}=.")
+    check_cxx_source_compiles("int main() { return 0; }"
+      PLUGIN_DEBUG_PREFIX_MAP_SUPPORTED)
+    unset(CMAKE_REQUIRED_FLAGS)
+    if(PLUGIN_DEBUG_PREFIX_MAP_SUPPORTED)
+      target_compile_options(${_TARGET_NAME} PRIVATE
+        -fdebug-prefix-map=${CMAKE_BINARY_DIR}=.)
+    else()
+      message(WARNING "-fdebug-prefix-map is not supported by compiler, "
+        "ccache results contain paths of build folder")
+    endif()
+  endif(USE_CCACHE)
+endmacro(add_plugin_link_options)
+
+# Instruments target (PGO_MODE=generate) or optimizes it
+# using profile from PGO_PROFILE_DIR (PGO_MODE=use).
+# GCC writes .gcda file per object file, Clang writes .profraw files
+# that must be merged into ${PGO_PROFILE_DIR}/merged.profdata by llvm-profdata.
+# see https://gcc.gnu.org/onlinedocs/gcc/Instrumentation-Options.html
+# see https://clang.llvm.org/docs/UsersManual.html#profile-guided-optimization
+macro(add_plugin_pgo_options _TARGET_NAME)
+  include(CheckCXXCompilerFlag)
+
+  if(NOT PGO_PROFILE_DIR)
+    message(FATAL_ERROR "PGO_MODE requires PGO_PROFILE_DIR")
+  endif()
+
+  set(_PGO_FLAGS "")
+  if(CMAKE_CXX_COMPILER_ID STREQUAL "GNU")
+    # GCC names .gcda files by absolute path of object file,
+    # make them relative to build dir, so profile can be used in other build folders
+    check_cxx_compiler_flag(-fprofile-prefix-path=${CMAKE_BINARY_DIR}
+      PLUGIN_PGO_PREFIX_PATH_SUPPORTED)
+    if(PLUGIN_PGO_PREFIX_PATH_SUPPORTED)
+      list(APPEND _PGO_FLAGS -fprofile-prefix-path=${CMAKE_BINARY_DIR})
+    else()
+      message(WARNING "-fprofile-prefix-path requires GCC 12, profile can be used only in same build folder")
+    endif()
+  endif()
+
+  if(PGO_MODE STREQUAL "generate")
+    message(STATUS "enabling PGO instrumentation on ${_TARGET_NAME}")
+    if(CMAKE_CXX_COMPILER_ID STREQUAL "GNU")
+      # plugins are multithreaded, avoid corrupted counters
+      list(APPEND _PGO_FLAGS -fprofile-update=atomic)
+    endif()
+    target_compile_options(${_TARGET_NAME} PRIVATE
+      -fprofile-generate=${PGO_PROFILE_DIR}
+      ${_PGO_FLAGS})
+    # PUBLIC: executables that link static plugin need profile runtime too
+    target_link_options(${_TARGET_NAME} PUBLIC
+      -fprofile-generate=${PGO_PROFILE_DIR})
+  elseif(PGO_MODE STREQUAL "use")
+    message(STATUS "enabling PGO on ${_TARGET_NAME} using ${PGO_PROFILE_DIR}")
+    if(CMAKE_CXX_COMPILER_ID MATCHES "Clang")
+      target_compile_options(${_TARGET_NAME} PRIVATE
+        -fprofile-use=${PGO_PROFILE_DIR}/merged.profdata
+        -Wno-profile-instr-unprofiled
+        -Wno-profile-instr-out-of-date
+        ${_PGO_FLAGS})
+    else()
+      target_compile_options(${_TARGET_NAME} PRIVATE
+        -fprofile-use=${PGO_PROFILE_DIR}
+        # counters of multithreaded code may be inconsistent
+        -fprofile-correction
+        -Wno-missing-profile
+        ${_PGO_FLAGS})
+    endif()
+  else()
+    message(FATAL_ERROR "unknown PGO_MODE: ${PGO_MODE}")
+  endif()
+endmacro(add_plugin_pgo_options)
+
+# Registers benchmark executable in CTest with label "benchmark",
+# CMakePackage runs it in benchmark stage (if ENABLE_BENCHMARK is set)
+# instead of tests stage. Google Benchmark executables report each benchmark,
+# for other executables wall time of whole run is measured.
+# Pass GOOGLE_BENCHMARK for Google Benchmark executables (label "google_benchmark"),
+# otherwise executable is probed with --benchmark_list_tests before run.
+# USAGE:
+# add_executable(my_plugin_benchmark ...)
+# add_plugin_benchmark(my_plugin_benchmark GOOGLE_BENCHMARK)
+macro(add_plugin_benchmark _TARGET_NAME)
+  set(_BENCHMARK_ARGS ${ARGN})
+  set(_BENCHMARK_LABELS benchmark)
+  list(FIND _BENCHMARK_ARGS GOOGLE_BENCHMARK _GOOGLE_BENCHMARK_INDEX)
+  if(NOT _GOOGLE_BENCHMARK_INDEX EQUAL -1)
+    list(APPEND _BENCHMARK_LABELS google_benchmark)
+  endif()
+  add_test(NAME ${_TARGET_NAME} COMMAND ${_TARGET_NAME})
+  set_tests_properties(${_TARGET_NAME} PROPERTIES
+    LABELS "${_BENCHMARK_LABELS}"
+    RUN_SERIAL ON)
+endmacro(add_plugin_benchmark)
+
+# Compiles target with hidden visibility and exports only symbols
+# from ${_LIB_NAME}_EXPORTED_SYMBOLS and ${_LIB_NAME}_EXPORTED_CXX_SYMBOLS
+# (COMMON_PLUGIN_EXPORTED_SYMBOLS and COMMON_PLUGIN_EXPORTED_CXX_SYMBOLS by default)
+# using version script (exported symbols list on macOS).
+# Smaller dynamic symbol table makes dlopen faster and allows
+# compiler to inline and remove unused code.
+macro(add_plugin_export_map _LIB_NAME)
+  set_target_properties(${_LIB_NAME} PROPERTIES
+    C_VISIBILITY_PRESET hidden
+    CXX_VISIBILITY_PRESET hidden
+    VISIBILITY_INLINES_HIDDEN ON)
+
+  if(NOT DEFINED ${_LIB_NAME}_EXPORTED_SYMBOLS)
+    set(${_LIB_NAME}_EXPORTED_SYMBOLS ${COMMON_PLUGIN_EXPORTED_SYMBOLS})
+  endif()
+  if(NOT DEFINED ${_LIB_NAME}_EXPORTED_CXX_SYMBOLS)
+    set(${_LIB_NAME}_EXPORTED_CXX_SYMBOLS ${COMMON_PLUGIN_EXPORTED_CXX_SYMBOLS})
+  endif()
+
+  get_target_property(_EXPORT_MAP_TARGET_TYPE ${_LIB_NAME} TYPE)
+  if(NOT _EXPORT_MAP_TARGET_TYPE STREQUAL "SHARED_LIBRARY")
+    # static plugins are linked into executable
+    message(STATUS "enabling hidden visibility on ${_LIB_NAME}")
+  elseif(MSVC)
+    # only __declspec(dllexport) symbols (CORRADE_PLUGIN_EXPORT)
+    # and symbols from /EXPORT flags are exported
+    message(STATUS "enabling export map on ${_LIB_NAME}")
+    set_target_properties(${_LIB_NAME} PROPERTIES
+      WINDOWS_EXPORT_ALL_SYMBOLS OFF)
+  else()
+    message(STATUS "enabling export map on ${_LIB_NAME}")
+    set(_EXPORT_MAP_CONTENT "")
+    if(APPLE)
+      # C symbols have "_" prefix, C++ symbols are matched by mangled names
+      set(_EXPORT_MAP_FILE ${CMAKE_CURRENT_BINARY_DIR}/${_LIB_NAME}.exported_symbols)
+      foreach(_SYMBOL ${${_LIB_NAME}_EXPORTED_SYMBOLS})
+        string(APPEND _EXPORT_MAP_CONTENT "_${_SYMBOL}\n")
+      endforeach()
+      set(_EXPORT_MAP_LINK_OPTION "LINKER:-exported_symbols_list,${_EXPORT_MAP_FILE}")
+    else()
+      set(_EXPORT_MAP_FILE ${CMAKE_CURRENT_BINARY_DIR}/${_LIB_NAME}.map)
+      string(APPEND _EXPORT_MAP_CONTENT "{\n  global:\n")
+      foreach(_SYMBOL ${${_LIB_NAME}_EXPORTED_SYMBOLS})
+        string(APPEND _EXPORT_MAP_CONTENT "    ${_SYMBOL};\n")
+      endforeach()
+      if(${_LIB_NAME}_EXPORTED_CXX_SYMBOLS)
+        string(APPEND _EXPORT_MAP_CONTENT "    extern \"C++\" {\n")
+        foreach(_SYMBOL ${${_LIB_NAME}_EXPORTED_CXX_SYMBOLS})
+          # NOTE: quoted names are matched exactly, without glob
+          string(APPEND _EXPORT_MAP_CONTENT "      ${_SYMBOL};\n")
+        endforeach()
+        string(APPEND _EXPORT_MAP_CONTENT "    };\n")
+      endif()
+      string(APPEND _EXPORT_MAP_CONTENT "  local: *;\n};\n")
+      set(_EXPORT_MAP_LINK_OPTION "LINKER:--version-script=${_EXPORT_MAP_FILE}")
+    endif()
+    # configure_file does not touch unchanged file, so library is not relinked
+    file(WRITE ${_EXPORT_MAP_FILE}.in "${_EXPORT_MAP_CONTENT}")
+    configure_file(${_EXPORT_MAP_FILE}.in ${_EXPORT_MAP_FILE} COPYONLY)
+    target_link_options(${_LIB_NAME} PRIVATE ${_EXPORT_MAP_LINK_OPTION})
+    set_property(TARGET ${_LIB_NAME} APPEND PROPERTY LINK_DEPENDS ${_EXPORT_MAP_FILE})
+  endif()
+endmacro(add_plugin_export_map)
+
+# Adds target that compares clean build time of plugin
+# with and without precompiled headers and unity build.
+# Each variant is configured in separate dir ${CMAKE_BINARY_DIR}/build_time_benchmark/
+# Added by `add_plugin_library` only if ENABLE_BUILD_TIME_BENCHMARK is set.
+# USAGE:
+# cmake -E time cmake --build . --target TARGET_NAME_build_time_benchmark
+macro(add_plugin_build_time_benchmark _LIB_NAME)
+  include(ProcessorCount)
+  ProcessorCount(BUILD_TIME_BENCHMARK_JOBS)
+
+  # cache variables passed to each configured variant
+  set(BUILD_TIME_BENCHMARK_FORWARD_VARS
+    CMAKE_BUILD_TYPE
+    CMAKE_TOOLCHAIN_FILE
+    CMAKE_C_COMPILER
+    CMAKE_CXX_COMPILER
+    BUILD_SHARED_LIBS
+    CONAN_AUTO_INSTALL
+    COMPILE_WITH_LLVM_TOOLS
+    ENABLE_LTO
+    ENABLE_VALGRIND
+    ENABLE_UBSAN
+    ENABLE_ASAN
+    ENABLE_MSAN
+    ENABLE_TSAN
+    ENABLE_CLING
+    UNITY_BUILD_BATCH_SIZE
+    PLUGIN_LINKER
+    ENABLE_PLUGIN_EXPORT_MAP
+    ENABLE_SPLIT_DWARF
+    ENABLE_COMPRESSED_DEBUG_SECTIONS
+  )
+  set(BUILD_TIME_BENCHMARK_CACHE_ARGS "-DENABLE_TESTS=OFF|-DENABLE_BUILD_TIME_BENCHMARK=OFF")
+  foreach(_VAR ${BUILD_TIME_BENCHMARK_FORWARD_VARS})
+    if(DEFINED ${_VAR})
+      # "|" instead of ";" to pass list as single argument
+      string(APPEND BUILD_TIME_BENCHMARK_CACHE_ARGS "|-D${_VAR}=${${_VAR}}")
+    endif()
+  endforeach()
+
+  add_custom_target(${_LIB_NAME}_build_time_benchmark
+    COMMAND ${CMAKE_COMMAND}
+      -DSOURCE_DIR=${CMAKE_SOURCE_DIR}
+      -DORIGINAL_BINARY_DIR=${CMAKE_BINARY_DIR}
+      -DBENCHMARK_DIR=${CMAKE_BINARY_DIR}/build_time_benchmark
+      -DBENCHMARK_TARGET=${_LIB_NAME}
+      -DGENERATOR=${CMAKE_GENERATOR}
+      -DJOBS=${BUILD_TIME_BENCHMARK_JOBS}
+      -DCACHE_ARGS=${BUILD_TIME_BENCHMARK_CACHE_ARGS}
+      -P ${BASIS_PLUGIN_HELPER_CMAKE_DIR}/plugin_build_time_benchmark.cmake
+    USES_TERMINAL
+    VERBATIM
+  )
+endmacro(add_plugin_build_time_benchmark)
+
 macro(copy_to_bin_dirs _SRC_CONF _DEST_FILE_NAME)
   # for builds with conan workspace
   if(EXISTS "${_SRC_CONF}")
@@ -1211,6 +1645,84 @@ macro(set_plugin_tools _LIB_NAME)
   message (STATUS "${_LIB_NAME} file == ${${_LIB_NAME}_file}")
 endmacro(set_plugin_tools)
 
+# Runs flextool for single input file through flextool_cache.py,
+# generation is skipped if outputs for same flextool, plugins, arguments,
+# input file and included headers are cached (FLEXTOOL_CACHE_DIR).
+# Commands of different input files run in parallel.
+# USAGE:
+# set_plugin_tools(my_plugin)
+# foreach(_INPUT ${flextool_input_files})
+#   get_filename_component(_INPUT_NAME ${_INPUT} NAME)
+#   add_flextool_command(
+#     INPUT ${_INPUT}
+#     OUTPUTS ${flextool_outdir}/${_INPUT_NAME}.generated
+#     PLUGINS ${my_plugin_file}
+#     DEPENDS my_plugin
+#     ARGS
+#       --outdir=${flextool_outdir}
+#       --load_plugin ${my_plugin_file}
+#       -extra-arg=-I${cling_includes}
+#       -extra-arg=-I${clang_includes}
+#       -extra-arg=-I${chromium_base_headers}
+#   )
+#   list(APPEND GENERATED_FILES ${flextool_outdir}/${_INPUT_NAME}.generated)
+# endforeach()
+# add_custom_target(my_plugin_codegen ALL DEPENDS ${GENERATED_FILES})
+function(add_flextool_command)
+  cmake_parse_arguments(FLEXTOOL "" "INPUT" "OUTPUTS;PLUGINS;DEPENDS;ARGS" ${ARGN})
+  if(NOT FLEXTOOL_INPUT OR NOT FLEXTOOL_OUTPUTS)
+    message(FATAL_ERROR "add_flextool_command requires INPUT and OUTPUTS")
+  endif()
+  if(NOT flextool)
+    message(FATAL_ERROR "flextool not found, call set_plugin_tools first")
+  endif()
+
+  find_package(Python3 COMPONENTS Interpreter REQUIRED)
+
+  if(NOT FLEXTOOL_CACHE_DIR)
+    if(DEFINED ENV{FLEXTOOL_CACHE_DIR})
+      set(FLEXTOOL_CACHE_DIR $ENV{FLEXTOOL_CACHE_DIR})
+    else()
+      set(FLEXTOOL_CACHE_DIR ${CMAKE_BINARY_DIR}/.flextool_cache)
+    endif()
+  endif()
+
+  get_filename_component(_INPUT_NAME ${FLEXTOOL_INPUT} NAME)
+  set(_CACHE_ARGS
+    --cache-dir ${FLEXTOOL_CACHE_DIR}
+    --input ${FLEXTOOL_INPUT}
+    --base-dir ${CMAKE_BINARY_DIR}
+    --base-dir ${CMAKE_SOURCE_DIR}
+    --deps-compiler ${CMAKE_CXX_COMPILER}
+  )
+  foreach(_OUTPUT ${FLEXTOOL_OUTPUTS})
+    list(APPEND _CACHE_ARGS --output ${_OUTPUT})
+  endforeach()
+  foreach(_PLUGIN ${FLEXTOOL_PLUGINS})
+    list(APPEND _CACHE_ARGS --plugin ${_PLUGIN})
+  endforeach()
+
+  # DEPFILE is supported only by Ninja
+  set(_DEPFILE_ARGS "")
+  if(CMAKE_GENERATOR MATCHES "Ninja")
+    set(_DEPFILE ${CMAKE_CURRENT_BINARY_DIR}/${_INPUT_NAME}.flextool.d)
+    list(APPEND _CACHE_ARGS --depfile ${_DEPFILE})
+    set(_DEPFILE_ARGS DEPFILE ${_DEPFILE})
+  endif()
+
+  add_custom_command(
+    OUTPUT ${FLEXTOOL_OUTPUTS}
+    COMMAND ${Python3_EXECUTABLE}
+      ${BASIS_PLUGIN_HELPER_CMAKE_DIR}/flextool_cache.py
+      ${_CACHE_ARGS}
+      -- ${flextool} ${FLEXTOOL_ARGS} ${FLEXTOOL_INPUT}
+    DEPENDS ${FLEXTOOL_INPUT} ${FLEXTOOL_PLUGINS} ${FLEXTOOL_DEPENDS}
+    ${_DEPFILE_ARGS}
+    COMMENT "Running flextool for ${_INPUT_NAME}"
+    VERBATIM
+  )
+endfunction(add_flextool_command)
+
 macro(generate_version_file _IN_FILE _OUT_FILE)
   configure_file(${_IN_FILE}
     ${_OUT_FILE})
@@ -0,0 +1,279 @@
+# Runs flextool only if its outputs are not in cache.
+#
+# Cache key is hash of flextool executable, loaded plugins, arguments,
+# input file and all headers included by input file (transitively).
+#
+# Lookup works like ccache:
+#   1. "direct" - headers from manifest of previous runs with same
+#      flextool, plugins, arguments and input file did not change
+#   2. "preprocessor" - headers listed by `DEPS_COMPILER -M`
+#      (include dirs and definitions are taken from -extra-arg= of flextool)
+#      have same content as in cached run (works across build folders)
+#   3. miss - flextool is run and declared outputs are stored in cache
+#
+# If included headers can not be listed (no --deps-compiler or it fails),
+# flextool is run without cache: key by input file only would restore
+# stale outputs after header changes.
+#
+# Build and source dirs (--base-dir) are stored in cached outputs
+# and manifests as placeholders and replaced by dirs of current build on restore,
+# so outputs with absolute paths are valid in any build folder.
+#
+# Writes depfile (Makefile syntax) with input file and included headers,
+# so Ninja re-runs command if any of them changes.
+#
+# USAGE (see add_flextool_command):
+# python flextool_cache.py --cache-dir DIR --input FILE --output FILE
+#   [--output FILE ...] [--plugin FILE ...] [--base-dir DIR ...]
+#   [--deps-compiler CXX] [--depfile FILE] -- FLEXTOOL ARGS...
+import argparse, hashlib, json, os, re, shutil, subprocess, sys, tempfile, time
+
+# bump to invalidate all cached results
+CACHE_VERSION = "1"
+
+# flextool arguments passed to clang, used to list included headers
+DEPS_FLAG_PREFIXES = ("-I", "-isystem", "-D", "-U", "-std=", "-include", "-iquote")
+DEPS_FLAGS_WITH_VALUE = ("-I", "-isystem", "-include", "-iquote", "-D", "-U")
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def string_digest(value):
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+def load_json(path, default = None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return default
+
+def save_json(path, data):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+# build and source dirs differ between build folders,
+# they must not change cache key
+def normalize(value, base_dirs):
+    # longest first, source dir may be inside build dir and vice versa
+    for index, base_dir in sorted(enumerate(base_dirs), key=lambda item: -len(item[1])):
+        value = re.sub(re.escape(base_dir) + r"(?=[/\\]|$)", "<base{}>".format(index), value)
+    return value
+
+def denormalize(value, base_dirs):
+    for index, base_dir in enumerate(base_dirs):
+        value = value.replace("<base{}>".format(index), base_dir)
+    return value
+
+# placeholders of base dirs in cached outputs
+def _output_placeholder(index):
+    return "@FLEXTOOL_CACHE_BASE_DIR_{}@".format(index).encode("utf-8")
+
+def relocate_output(content, base_dirs):
+    for index, base_dir in sorted(enumerate(base_dirs), key=lambda item: -len(item[1])):
+        content = content.replace(base_dir.encode("utf-8"), _output_placeholder(index))
+    return content
+
+def restore_output(content, base_dirs):
+    for index, base_dir in enumerate(base_dirs):
+        content = content.replace(_output_placeholder(index), base_dir.encode("utf-8"))
+    return content
+
+def extra_args(flextool_command):
+    args = []
+    for arg in flextool_command:
+        for prefix in ("-extra-arg=", "--extra-arg="):
+            if arg.startswith(prefix):
+                args.append(arg[len(prefix):])
+    return args
+
+# Returns compiler flags used to list headers of input file
+def deps_flags(flextool_command):
+    flags = []
+    pending_value = False
+    for arg in extra_args(flextool_command):
+        if pending_value:
+            flags.append(arg)
+            pending_value = False
+        elif arg in DEPS_FLAGS_WITH_VALUE:
+            flags.append(arg)
+            pending_value = True
+        elif arg.startswith(DEPS_FLAG_PREFIXES):
+            flags.append(arg)
+    return flags
+
+# Returns list of files included by input file (including input file)
+# or None if compiler failed
+def list_dependencies(compiler, input_file, flextool_command):
+    try:
+        output = subprocess.check_output(
+            [compiler, "-x", "c++", "-M", "-MT", "deps"] + deps_flags(flextool_command) + [input_file])
+    except (OSError, subprocess.CalledProcessError) as error:
+        print("flextool cache: can not list headers of {}: {}".format(input_file, error))
+        return None
+    # "deps: a.cc \
+    #   b.h c.h"
+    text = output.decode("utf-8").replace("\\\n", " ")
+    _, _, paths = text.partition(":")
+    deps = []
+    for path in paths.replace("\\ ", "\0").split():
+        path = os.path.abspath(path.replace("\0", " "))
+        if path not in deps:
+            deps.append(path)
+    return deps
+
+def deps_digests(deps):
+    digests = {}
+    for path in deps:
+        if not os.path.isfile(path):
+            return None
+        digests[path] = file_digest(path)
+    return digests
+
+class FlextoolCache:
+    def __init__(self, cache_dir, base_dirs = ()):
+        self.cache_dir = cache_dir
+        self.base_dirs = list(base_dirs)
+
+    def _result_dir(self, key):
+        return os.path.join(self.cache_dir, "results", key[:2], key)
+
+    def _manifest_path(self, key):
+        return os.path.join(self.cache_dir, "manifests", key[:2], key + ".json")
+
+    def has_result(self, key):
+        return os.path.isfile(os.path.join(self._result_dir(key), "result.json"))
+
+    # Returns (result key, deps) of previous run with unchanged headers
+    def find_direct(self, base_key):
+        for entry in load_json(self._manifest_path(base_key), []):
+            # paths of manifest are normalized, headers are looked up in current build
+            digests = dict((denormalize(path, self.base_dirs), digest)
+                           for path, digest in entry["deps"].items())
+            if deps_digests(digests) == digests and self.has_result(entry["result"]):
+                return entry["result"], list(digests)
+        return None, None
+
+    def add_manifest_entry(self, base_key, result_key, digests):
+        digests = dict((normalize(path, self.base_dirs), digest)
+                       for path, digest in digests.items())
+        path = self._manifest_path(base_key)
+        entries = [entry for entry in load_json(path, [])
+                   if entry["result"] != result_key or entry["deps"] != digests]
+        # keep few latest variants of headers
+        entries = ([{"result": result_key, "deps": digests}] + entries)[:10]
+        save_json(path, entries)
+
+    def restore(self, key, outputs):
+        result_dir = self._result_dir(key)
+        for index, output in enumerate(outputs):
+            output_dir = os.path.dirname(output)
+            if output_dir and not os.path.isdir(output_dir):
+                os.makedirs(output_dir, exist_ok=True)
+            with open(os.path.join(result_dir, str(index)), "rb") as f:
+                content = restore_output(f.read(), self.base_dirs)
+            with open(output, "wb") as f:
+                f.write(content)
+
+    def store(self, key, outputs):
+        result_dir = self._result_dir(key)
+        parent_dir = os.path.dirname(result_dir)
+        os.makedirs(parent_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent_dir)
+        for index, output in enumerate(outputs):
+            with open(output, "rb") as f:
+                content = relocate_output(f.read(), self.base_dirs)
+            with open(os.path.join(tmp_dir, str(index)), "wb") as f:
+                f.write(content)
+        with open(os.path.join(tmp_dir, "result.json"), "w") as f:
+            json.dump({"outputs": [os.path.basename(output) for output in outputs]}, f)
+        try:
+            os.rename(tmp_dir, result_dir)
+        except OSError:
+            # stored by parallel run
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def write_depfile(path, outputs, deps):
+    def escape(value):
+        return value.replace(" ", "\\ ")
+    with open(path, "w") as f:
+        f.write("{}: {}\n".format(" ".join(escape(output) for output in outputs),
+                                  " \\\n  ".join(escape(dep) for dep in deps)))
+
+def run_flextool(command, outputs):
+    subprocess.check_call(command)
+    missing = [output for output in outputs if not os.path.isfile(output)]
+    if missing:
+        sys.exit("flextool did not generate declared outputs: {}".format(", ".join(missing)))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache-dir", required=True)
+    parser.add_argument("--input", required=True)
+    parser.add_argument("--output", action="append", required=True)
+    parser.add_argument("--plugin", action="append", default=[])
+    parser.add_argument("--base-dir", action="append", default=[])
+    parser.add_argument("--deps-compiler")
+    parser.add_argument("--depfile")
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not command:
+        sys.exit("flextool command is required after --")
+    outputs = [os.path.abspath(output) for output in args.output]
+    input_file = os.path.abspath(args.input)
+    base_dirs = [os.path.abspath(base_dir) for base_dir in args.base_dir]
+
+    flextool = shutil.which(command[0]) or command[0]
+    base_key = string_digest(json.dumps({
+        "version": CACHE_VERSION,
+        "flextool": file_digest(flextool),
+        "plugins": [file_digest(plugin) for plugin in args.plugin],
+        "command": [normalize(arg, base_dirs) for arg in command[1:]],
+        "outputs": [normalize(output, base_dirs) for output in outputs],
+        "input": file_digest(input_file),
+    }, sort_keys=True))
+
+    cache = FlextoolCache(args.cache_dir, base_dirs)
+    start = time.time()
+    result_key, deps = cache.find_direct(base_key)
+    status = "direct hit"
+    if result_key is None:
+        digests = None
+        if args.deps_compiler:
+            deps = list_dependencies(args.deps_compiler, input_file, command)
+            digests = deps_digests(deps) if deps is not None else None
+        if digests is None:
+            # unknown headers, run without cache
+            status = "skipped"
+            deps = [input_file]
+            run_flextool(command, outputs)
+        else:
+            result_key = string_digest(base_key + "\n" + "\n".join(
+                sorted(digests.values())))
+            if cache.has_result(result_key):
+                status = "preprocessor hit"
+            else:
+                status = "miss"
+                run_flextool(command, outputs)
+                cache.store(result_key, outputs)
+            cache.add_manifest_entry(base_key, result_key, digests)
+
+    if status not in ("miss", "skipped"):
+        cache.restore(result_key, outputs)
+    if args.depfile:
+        write_depfile(args.depfile, outputs, deps)
+    print("flextool cache {} for {} ({:.2f} sec)".format(
+        status, os.path.basename(input_file), time.time() - start))
+
+if __name__ == "__main__":
+    main()
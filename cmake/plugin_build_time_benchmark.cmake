@@ -0,0 +1,66 @@
+# Compares clean build time of plugin
+# with and without precompiled headers and unity build.
+# see add_plugin_build_time_benchmark in Findbasis_plugin_helper.cmake
+#
+# USAGE:
+# cmake -DSOURCE_DIR=... -DORIGINAL_BINARY_DIR=... -DBENCHMARK_DIR=...
+#   -DBENCHMARK_TARGET=... -DGENERATOR=... -DJOBS=... -DCACHE_ARGS=...
+#   -P plugin_build_time_benchmark.cmake
+
+foreach(_VAR SOURCE_DIR ORIGINAL_BINARY_DIR BENCHMARK_DIR BENCHMARK_TARGET GENERATOR JOBS)
+  if(NOT DEFINED ${_VAR})
+    message(FATAL_ERROR "${_VAR} must be defined")
+  endif()
+endforeach()
+
+string(REPLACE "|" ";" CACHE_ARGS "${CACHE_ARGS}")
+
+set(VARIANTS baseline pch unity pch_unity)
+set(baseline_ARGS -DENABLE_PCH=OFF -DENABLE_UNITY_BUILD=OFF)
+set(pch_ARGS -DENABLE_PCH=ON -DENABLE_UNITY_BUILD=OFF)
+set(unity_ARGS -DENABLE_PCH=OFF -DENABLE_UNITY_BUILD=ON)
+set(pch_unity_ARGS -DENABLE_PCH=ON -DENABLE_UNITY_BUILD=ON)
+
+# files generated by conan (conanbuildinfo.cmake, conan_paths.cmake, etc.)
+file(GLOB CONAN_FILES
+  ${ORIGINAL_BINARY_DIR}/conan*.cmake
+  ${ORIGINAL_BINARY_DIR}/conan*.txt)
+
+set(REPORT "")
+foreach(VARIANT ${VARIANTS})
+  set(VARIANT_DIR ${BENCHMARK_DIR}/${VARIANT})
+  file(REMOVE_RECURSE ${VARIANT_DIR})
+  file(MAKE_DIRECTORY ${VARIANT_DIR})
+  if(CONAN_FILES)
+    file(COPY ${CONAN_FILES} DESTINATION ${VARIANT_DIR})
+  endif()
+
+  message(STATUS "configuring ${VARIANT} in ${VARIANT_DIR}")
+  execute_process(
+    COMMAND ${CMAKE_COMMAND} -G ${GENERATOR} ${CACHE_ARGS} ${${VARIANT}_ARGS} ${SOURCE_DIR}
+    WORKING_DIRECTORY ${VARIANT_DIR}
+    RESULT_VARIABLE RESULT
+    OUTPUT_QUIET)
+  if(RESULT)
+    message(FATAL_ERROR "unable to configure ${VARIANT}")
+  endif()
+
+  message(STATUS "building ${BENCHMARK_TARGET} (${VARIANT})")
+  string(TIMESTAMP START "%s" UTC)
+  execute_process(
+    COMMAND ${CMAKE_COMMAND} --build . --target ${BENCHMARK_TARGET} --parallel ${JOBS}
+    WORKING_DIRECTORY ${VARIANT_DIR}
+    RESULT_VARIABLE RESULT
+    OUTPUT_QUIET)
+  string(TIMESTAMP END "%s" UTC)
+  if(RESULT)
+    message(FATAL_ERROR "unable to build ${VARIANT}")
+  endif()
+
+  math(EXPR DURATION "${END} - ${START}")
+  message(STATUS "${VARIANT}: ${DURATION} sec")
+  string(APPEND REPORT "${VARIANT}: ${DURATION} sec\n")
+endforeach()
+
+file(WRITE ${BENCHMARK_DIR}/report.txt "${REPORT}")
+message(STATUS "build time report: ${BENCHMARK_DIR}/report.txt")
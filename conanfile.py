@@ -25,6 +25,8 @@ class ConanCommonRecipes(ConanFile):
         self.copy("LICENSE", dst="licenses", src='.')
         self.copy(pattern="LICENSE", dst="licenses")
         self.copy(pattern="*.cmake", dst=os.path.join(self.package_folder, "cmake"), src='cmake')
+        # scripts used by cmake functions (flextool_cache.py, etc.)
+        self.copy(pattern="*.py", dst=os.path.join(self.package_folder, "cmake"), src='cmake')
         #self.copy(pattern="*.cmake", dst=self.package_folder, src='cmake')
 
         # Local build
@@ -34,13 +36,17 @@ class ConanCommonRecipes(ConanFile):
 
     # Importing files copies files from the local store to your project.
     def imports(self):
+        from basis_plugin_helper.imports import import_files
+
         dest = os.getenv("CONAN_IMPORT_PATH", "bin")
-        self.copy("license*", dst=dest, ignore_case=True)
-        self.copy("*.dll", dst=dest, src="bin")
-        self.copy("*.so", dst=dest, src="bin")
-        self.copy("*.dylib*", dst=dest, src="lib")
-        self.copy("*.lib*", dst=dest, src="lib")
-        self.copy("*.a*", dst=dest, src="lib")
+        import_files(self, dest, [
+            ("license*", "", True),
+            ("*.dll", "bin", False),
+            ("*.so", "bin", False),
+            ("*.dylib*", "lib", False),
+            ("*.lib*", "lib", False),
+            ("*.a*", "lib", False),
+        ], mode = os.getenv("IMPORT_MODE", "copy"))
         self.copy("assets", dst=dest, src="assets")
 
     def package_id(self):